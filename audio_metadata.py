@@ -0,0 +1,260 @@
+"""
+Pure-Python audio header parsing
+Reads ID3v1/ID3v2 tags and MPEG audio frame headers for MP3 files, and the
+OpusHead/OpusTags headers plus last granule position for Ogg/Opus files,
+to get duration, bitrate, sample rate and tags without decoding any audio.
+"""
+
+import os
+import struct
+
+# MPEG audio tables, indexed by [version][layer] (version: 1, 2, 2.5 -> 0, 1, 2)
+_BITRATES = {
+    (1, 1): (0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+    (1, 2): (0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+    (1, 3): (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    (2, 1): (0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+    (2, 2): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+    (2, 3): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+_SAMPLE_RATES = {1: (44100, 48000, 32000), 2: (22050, 24000, 16000), 2.5: (11025, 12000, 8000)}
+_VERSIONS = {0: 2.5, 2: 2, 3: 1}
+_LAYERS = {1: 3, 2: 2, 3: 1}
+
+_ID3_TEXT_FRAMES = {
+    b'TIT2': 'title', b'TPE1': 'artist', b'TALB': 'album', b'TYER': 'year', b'TDRC': 'year',
+    b'TT2': 'title', b'TP1': 'artist', b'TAL': 'album', b'TYE': 'year',
+}
+
+
+class FrameHeader:
+    """A decoded MPEG audio frame header"""
+
+    __slots__ = ('version', 'layer', 'bitrate', 'sample_rate', 'channels', 'padding', 'length', 'samples')
+
+    def __init__(self, version, layer, bitrate, sample_rate, channels, padding):
+        self.version = version
+        self.layer = layer
+        self.bitrate = bitrate
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.padding = padding
+        if layer == 1:
+            self.samples = 384
+            self.length = (12 * bitrate * 1000 // sample_rate + padding) * 4
+        else:
+            self.samples = 576 if (layer == 3 and version != 1) else 1152
+            self.length = self.samples // 8 * bitrate * 1000 // sample_rate + padding
+
+
+def parse_frame_header(data, offset=0):
+    """Decode the 4-byte MPEG frame header at offset, or return None"""
+    if len(data) < offset + 4:
+        return None
+    b1, b2, b3 = data[offset + 1], data[offset + 2], data[offset + 3]
+    if data[offset] != 0xFF or (b1 & 0xE0) != 0xE0:
+        return None
+    version = _VERSIONS.get((b1 >> 3) & 0x03)
+    layer = _LAYERS.get((b1 >> 1) & 0x03)
+    bitrate_index = b2 >> 4
+    rate_index = (b2 >> 2) & 0x03
+    if version is None or layer is None or bitrate_index in (0, 15) or rate_index == 3:
+        return None
+    bitrate = _BITRATES[(1 if version == 1 else 2, layer)][bitrate_index]
+    sample_rate = _SAMPLE_RATES[version][rate_index]
+    channels = 1 if (b3 >> 6) == 3 else 2
+    padding = (b2 >> 1) & 0x01
+    return FrameHeader(version, layer, bitrate, sample_rate, channels, padding)
+
+
+def _syncsafe(data):
+    return (data[0] << 21) | (data[1] << 14) | (data[2] << 7) | data[3]
+
+
+def _decode_text(payload):
+    if not payload:
+        return ''
+    encoding, body = payload[0], payload[1:]
+    codec = {0: 'latin-1', 1: 'utf-16', 2: 'utf-16-be', 3: 'utf-8'}.get(encoding, 'latin-1')
+    return body.decode(codec, errors='replace').strip('\x00').strip()
+
+
+def read_id3v2(f):
+    """Return (tags, audio_start) for the ID3v2 tag at the start of a file"""
+    header = f.read(10)
+    if len(header) < 10 or header[:3] != b'ID3':
+        return {}, 0
+    major = header[3]
+    flags = header[5]
+    size = _syncsafe(header[6:10])
+    audio_start = 10 + size + (10 if flags & 0x10 else 0)
+    body = f.read(size)
+
+    tags = {}
+    pos = 0
+    id_len, head_len = (3, 6) if major == 2 else (4, 10)
+    while pos + head_len <= len(body):
+        frame_id = body[pos:pos + id_len]
+        if not frame_id.strip(b'\x00'):
+            break
+        if major == 2:
+            frame_size = int.from_bytes(body[pos + 3:pos + 6], 'big')
+        elif major == 4:
+            frame_size = _syncsafe(body[pos + 4:pos + 8])
+        else:
+            frame_size = int.from_bytes(body[pos + 4:pos + 8], 'big')
+        payload = body[pos + head_len:pos + head_len + frame_size]
+        key = _ID3_TEXT_FRAMES.get(frame_id)
+        if key and key not in tags:
+            text = _decode_text(payload)
+            if text:
+                tags[key] = text
+        pos += head_len + frame_size
+    return tags, audio_start
+
+
+def read_id3v1(f, file_size):
+    """Return (tags, tag_size) for an ID3v1 tag at the end of a file"""
+    if file_size < 128:
+        return {}, 0
+    f.seek(file_size - 128)
+    block = f.read(128)
+    if block[:3] != b'TAG':
+        return {}, 0
+
+    def text(start, end):
+        return block[start:end].split(b'\x00')[0].decode('latin-1').strip()
+
+    tags = {k: v for k, v in (('title', text(3, 33)), ('artist', text(33, 63)), ('album', text(63, 93))) if v}
+    return tags, 128
+
+
+def find_first_frame(f, start, limit=64 * 1024):
+    """Offset and header of the first valid MPEG frame at or after start"""
+    f.seek(start)
+    data = f.read(limit)
+    for i in range(len(data) - 3):
+        if data[i] != 0xFF:
+            continue
+        header = parse_frame_header(data, i)
+        if header is None:
+            continue
+        # Require a second frame right after to avoid false syncs
+        following = parse_frame_header(data, i + header.length)
+        if following is not None or i + header.length >= len(data):
+            return start + i, header
+    return None, None
+
+
+def _xing_frames(f, offset, header):
+    """Frame count from a Xing/Info or VBRI header in the first frame, if any"""
+    f.seek(offset)
+    frame = f.read(header.length)
+    if header.version == 1:
+        side = 17 if header.channels == 1 else 32
+    else:
+        side = 9 if header.channels == 1 else 17
+    xing = 4 + side
+    if frame[xing:xing + 4] in (b'Xing', b'Info'):
+        flags = struct.unpack('>I', frame[xing + 4:xing + 8])[0]
+        if flags & 0x01:
+            return struct.unpack('>I', frame[xing + 8:xing + 12])[0]
+    if frame[36:40] == b'VBRI':
+        return struct.unpack('>I', frame[50:54])[0]
+    return None
+
+
+def read_mp3(file_path):
+    """Duration, bitrate, sample rate, channels and tags of an MP3 file"""
+    file_size = os.path.getsize(file_path)
+    with open(file_path, 'rb') as f:
+        tags, audio_start = read_id3v2(f)
+        v1_tags, v1_size = read_id3v1(f, file_size)
+        for key, value in v1_tags.items():
+            tags.setdefault(key, value)
+
+        offset, header = find_first_frame(f, audio_start)
+        if header is None:
+            return {"tags": tags}
+
+        audio_bytes = file_size - offset - v1_size
+        frames = _xing_frames(f, offset, header)
+        if frames:
+            duration = frames * header.samples / header.sample_rate
+            bitrate = int(audio_bytes * 8 / duration / 1000) if duration else header.bitrate
+        else:
+            bitrate = header.bitrate
+            duration = audio_bytes * 8 / (bitrate * 1000)
+
+    return {
+        "duration": duration,
+        "bitrate": bitrate,
+        "sample_rate": header.sample_rate,
+        "channels": header.channels,
+        "audio_start": offset,
+        "tags": tags,
+    }
+
+
+def _ogg_last_granule(f, file_size):
+    """Granule position of the last Ogg page"""
+    chunk = min(file_size, 64 * 1024)
+    f.seek(file_size - chunk)
+    data = f.read(chunk)
+    pos = data.rfind(b'OggS')
+    while pos != -1:
+        if pos + 14 <= len(data):
+            return struct.unpack('<q', data[pos + 6:pos + 14])[0]
+        pos = data.rfind(b'OggS', 0, pos)
+    return None
+
+
+def read_ogg_opus(file_path):
+    """Duration, bitrate, channels and tags of an Ogg/Opus file"""
+    # Imported lazily: discord.py is only needed for Ogg files
+    from discord.oggparse import OggStream
+
+    file_size = os.path.getsize(file_path)
+    tags = {}
+    with open(file_path, 'rb') as f:
+        packets = OggStream(f).iter_packets()
+        head = next(packets, b'')
+        if not head.startswith(b'OpusHead'):
+            return {"tags": tags}
+        channels = head[9]
+        pre_skip = struct.unpack('<H', head[10:12])[0]
+
+        comments = next(packets, b'')
+        if comments.startswith(b'OpusTags'):
+            vendor_len = struct.unpack('<I', comments[8:12])[0]
+            pos = 12 + vendor_len
+            count = struct.unpack('<I', comments[pos:pos + 4])[0]
+            pos += 4
+            for _ in range(count):
+                length = struct.unpack('<I', comments[pos:pos + 4])[0]
+                entry = comments[pos + 4:pos + 4 + length].decode('utf-8', errors='replace')
+                pos += 4 + length
+                key, _, value = entry.partition('=')
+                key = key.lower()
+                if key in ('title', 'artist', 'album') and value:
+                    tags.setdefault(key, value)
+
+        granule = _ogg_last_granule(f, file_size)
+
+    duration = max(0, granule - pre_skip) / 48000 if granule else None
+    return {
+        "duration": duration,
+        "bitrate": int(file_size * 8 / duration / 1000) if duration else None,
+        "sample_rate": 48000,
+        "channels": channels,
+        "tags": tags,
+    }
+
+
+def read_metadata(file_path):
+    """Dispatch on extension; returns a dict with whatever could be read"""
+    if file_path.lower().endswith('.mp3'):
+        return read_mp3(file_path)
+    if file_path.lower().endswith(('.opus', '.ogg')):
+        return read_ogg_opus(file_path)
+    return {"tags": {}}
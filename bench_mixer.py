@@ -0,0 +1,117 @@
+"""
+Mixer and crossfade cost benchmark
+Times MixerSource.read() with a growing number of overlays and
+CrossfadeSource.read() over whole fade windows, end to end on real Opus
+packets: every frame includes the Opus decodes, the NumPy work and the
+re-encode, against the 20 ms real-time budget of the send loop.
+
+    python bench_mixer.py --frames 5000 --overlays 0 1 2 4 8 --fade 5
+"""
+
+import argparse
+import time
+
+import discord
+import numpy as np
+
+from crossfade import CrossfadeSource
+from mixer import SAMPLES_PER_FRAME, MixerSource
+
+FRAME_BUDGET_US = 20_000
+# Seconds of distinct audio encoded up front, then looped
+CLIP_SECONDS = 5
+
+
+def summarize(samples):
+    ordered = sorted(samples)
+    mean = sum(ordered) / len(ordered)
+    p99 = ordered[min(len(ordered) - 1, int(0.99 * len(ordered)))]
+    return mean, p99
+
+
+def encode_clip(rng, frequency):
+    """Opus packets of a loud tone over noise, like a busy music track"""
+    encoder = discord.opus.Encoder()
+    t = np.arange(CLIP_SECONDS * 50 * SAMPLES_PER_FRAME) / 48000
+    tone = 12000 * np.sin(2 * np.pi * frequency * t)
+    noise = rng.normal(0, 3000, len(t))
+    mono = np.clip(tone + noise, -32768, 32767).astype(np.int16)
+    stereo = np.repeat(mono, 2)
+    step = SAMPLES_PER_FRAME * 2
+    return [encoder.encode(stereo[i:i + step].tobytes(), SAMPLES_PER_FRAME) for i in range(0, len(stereo), step)]
+
+
+class PacketSource(discord.AudioSource):
+    """Pre-encoded Opus packets played in a loop"""
+
+    def __init__(self, packets):
+        self.packets = packets
+        self.index = 0
+
+    def read(self):
+        packet = self.packets[self.index % len(self.packets)]
+        self.index += 1
+        return packet
+
+    def is_opus(self):
+        return True
+
+
+def bench_mixer(overlays, frames, clips):
+    mixer = MixerSource(PacketSource(clips[0]))
+    for i in range(overlays):
+        mixer.add(PacketSource(clips[(i + 1) % len(clips)]), 0.8)
+    samples = []
+    for _ in range(frames):
+        started = time.perf_counter()
+        mixer.read()
+        samples.append((time.perf_counter() - started) * 1e6)
+    return summarize(samples)
+
+
+def bench_crossfade(fade_seconds, frames, clips):
+    """Per-frame cost inside fade windows, one fresh transition per window"""
+    fade_frames = max(1, int(fade_seconds * 50))
+    samples = []
+    while len(samples) < frames:
+        chain = CrossfadeSource(
+            PacketSource(clips[0]), fade_frames, fade_frames,
+            next_track=lambda: (PacketSource(clips[1]), 10 * fade_frames),
+            on_advance=lambda source: None,
+        )
+        for _ in range(fade_frames):
+            started = time.perf_counter()
+            chain.read()
+            samples.append((time.perf_counter() - started) * 1e6)
+    return summarize(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-frame cost of the PCM mixer and crossfade")
+    parser.add_argument('--frames', type=int, default=5000)
+    parser.add_argument('--overlays', type=int, nargs='+', default=[0, 1, 2, 4, 8])
+    parser.add_argument('--fade', type=float, default=5.0, help="crossfade length in seconds")
+    parser.add_argument('--opus', help="path to libopus, if it is not found automatically")
+    args = parser.parse_args()
+
+    if args.opus:
+        discord.opus.load_opus(args.opus)
+    rng = np.random.default_rng(0)
+    try:
+        clips = [encode_clip(rng, frequency) for frequency in (220, 330, 440, 550)]
+    except Exception as e:
+        print(f"❌ libopus is required for this benchmark: {e}")
+        return
+
+    print(f"{'path':>12} {'mean us':>10} {'p99 us':>10} {'% budget':>10}")
+    for overlays in args.overlays:
+        mean, p99 = bench_mixer(overlays, args.frames, clips)
+        label = f"mix +{overlays}"
+        print(f"{label:>12} {mean:>10.1f} {p99:>10.1f} {100 * p99 / FRAME_BUDGET_US:>9.2f}%")
+
+    mean, p99 = bench_crossfade(args.fade, args.frames, clips)
+    print(f"{'xfade':>12} {mean:>10.1f} {p99:>10.1f} {100 * p99 / FRAME_BUDGET_US:>9.2f}%")
+
+
+if __name__ == "__main__":
+    main()
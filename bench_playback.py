@@ -0,0 +1,237 @@
+"""
+Time-to-first-audio benchmark
+Drives the real !play command and the interaction play path from main.py
+against a stand-in voice client, with no Discord connection, and reports
+time to first Opus packet, ffmpeg spawn time and source frames per second.
+
+    python bench_playback.py --runs 20 --frames 250
+"""
+
+import argparse
+import asyncio
+import math
+import threading
+import time
+from types import SimpleNamespace
+
+import discord
+
+import main
+import player
+from music_library import library
+from transcoder import transcoder
+from voice_sessions import sessions
+
+
+class FakeVoiceClient:
+    """Stand-in for discord.VoiceClient: reads the source on a thread like AudioPlayer"""
+
+    def __init__(self, channel, frames):
+        self.channel = channel
+        self.frames = frames
+        self.first_packet_at = None
+        self.fps = None
+        self._thread = None
+        self._stopped = threading.Event()
+        self.first_packet = threading.Event()
+
+    def is_connected(self):
+        return True
+
+    def is_playing(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def is_paused(self):
+        return False
+
+    def play(self, source, after=None):
+        self._stopped.clear()
+        self.first_packet.clear()
+        self.first_packet_at = None
+        self.fps = None
+        self._thread = threading.Thread(target=self._run, args=(source, after), daemon=True)
+        self._thread.start()
+
+    def _run(self, source, after):
+        error = None
+        try:
+            packet = source.read()
+            self.first_packet_at = time.perf_counter()
+            self.first_packet.set()
+            # Unpaced reads: how far ahead of real time the source can run
+            count = 1 if packet else 0
+            while packet and count < self.frames and not self._stopped.is_set():
+                packet = source.read()
+                count += 1 if packet else 0
+            elapsed = time.perf_counter() - self.first_packet_at
+            self.fps = count / elapsed if elapsed > 0 else None
+        except Exception as e:
+            error = e
+            self.first_packet.set()
+        finally:
+            source.cleanup()
+        if after is not None:
+            after(error)
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+
+    async def disconnect(self, force=False):
+        self.stop()
+
+    async def move_to(self, channel):
+        self.channel = channel
+
+
+class FakeChannel:
+    """Voice channel whose connect() hands out fake voice clients"""
+
+    def __init__(self, name, frames):
+        self.name = name
+        self.frames = frames
+        self.members = []
+
+    async def connect(self, **kwargs):
+        return FakeVoiceClient(self, self.frames)
+
+
+async def _noop(*args, **kwargs):
+    return None
+
+
+def fake_context(guild_id, channel):
+    return SimpleNamespace(
+        guild=SimpleNamespace(id=guild_id),
+        author=SimpleNamespace(voice=SimpleNamespace(channel=channel)),
+        channel=None,
+        send=_noop,
+    )
+
+
+def fake_interaction(guild_id, channel):
+    """A button click, like the library browser's"""
+    return SimpleNamespace(
+        type=discord.InteractionType.component,
+        guild=SimpleNamespace(id=guild_id),
+        user=SimpleNamespace(voice=SimpleNamespace(channel=channel)),
+        channel=None,
+        delete_original_response=_noop,
+        response=SimpleNamespace(defer=_noop, send_message=_noop),
+        followup=SimpleNamespace(send=_noop),
+    )
+
+
+class SpawnTimer:
+    """Times every transcoder.open call made while installed"""
+
+    def __init__(self):
+        self.samples = []
+        self._open = None
+
+    def install(self):
+        self._open = transcoder.open
+
+        def timed_open(factory, wait=True):
+            started = time.perf_counter()
+            source = self._open(factory, wait)
+            self.samples.append(time.perf_counter() - started)
+            return source
+
+        transcoder.open = timed_open
+
+    def uninstall(self):
+        transcoder.open = self._open
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile"""
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+async def run_once(mode, filename, guild_id, frames, spawns):
+    channel = FakeChannel('bench', frames)
+    session = sessions.get(guild_id)
+    spawned_before = len(spawns.samples)
+    started = time.perf_counter()
+
+    if mode == 'command':
+        session.voice_client = FakeVoiceClient(channel, frames)
+        await main.play_music.callback(fake_context(guild_id, channel), filename=filename)
+    else:
+        await main.play_from_interaction(fake_interaction(guild_id, channel), filename)
+
+    voice_client = session.voice_client
+    if voice_client is None or voice_client._thread is None:
+        # The handler refused to play (e.g. transcoder budget exhausted)
+        sessions.remove(guild_id)
+        return None, None, False
+    await asyncio.to_thread(voice_client.first_packet.wait, 30)
+    ttfp = voice_client.first_packet_at - started if voice_client.first_packet_at else None
+
+    # Let the fake player finish its unpaced read, then tear the session down
+    await asyncio.to_thread(voice_client._thread.join)
+    fps = voice_client.fps
+    async with session.lock:
+        player.stop(session)
+    sessions.remove(guild_id)
+    return ttfp, fps, len(spawns.samples) > spawned_before
+
+
+def report(label, results):
+    ttfps = [r[0] * 1000 for r in results if r[0] is not None]
+    fps = [r[1] for r in results if r[1]]
+    if not ttfps:
+        print(f"{label:<24} no samples")
+        return
+    print(
+        f"{label:<24} n={len(ttfps):<4} "
+        f"TTFP p50={percentile(ttfps, 50):7.1f} ms  p99={percentile(ttfps, 99):7.1f} ms  "
+        f"fps p50={percentile(fps, 50) or 0:8.0f}"
+    )
+
+
+async def run(args):
+    library.refresh(force=True)
+    names = [args.track] if args.track else library.names()
+    if not names:
+        print("No tracks in the music folder")
+        return
+
+    spawns = SpawnTimer()
+    spawns.install()
+    try:
+        for mode in ('command', 'interaction'):
+            by_path = {True: [], False: []}
+            for i in range(args.runs):
+                filename = names[i % len(names)]
+                ttfp, fps, spawned = await run_once(mode, filename, 10_000 + i, args.frames, spawns)
+                by_path[spawned].append((ttfp, fps))
+            report(f"{mode} (ffmpeg)", by_path[True])
+            report(f"{mode} (in-process)", by_path[False])
+    finally:
+        spawns.uninstall()
+
+    if spawns.samples:
+        spawn_ms = [s * 1000 for s in spawns.samples]
+        print(
+            f"{'ffmpeg spawn':<24} n={len(spawn_ms):<4} "
+            f"p50={percentile(spawn_ms, 50):7.1f} ms  p99={percentile(spawn_ms, 99):7.1f} ms"
+        )
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Measure time to first audio packet")
+    parser.add_argument('--runs', type=int, default=20, help="plays per entry point")
+    parser.add_argument('--frames', type=int, default=250, help="20 ms frames read per play")
+    parser.add_argument('--track', help="library file to play (default: cycle through all)")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    asyncio.run(run(parse_args()))
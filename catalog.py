@@ -0,0 +1,225 @@
+"""
+Persistent metadata catalog
+Duration, bitrate, sample rate and tags for every library track, stored in
+SQLite and filled by a background thread pool. Rows are keyed by path and
+mtime, so a restart only parses files that are new or changed. A second,
+slower pass adds loudness and silence measurements (see loudness.py).
+With shard clusters the database is shared: only cluster 0 writes it and
+runs the analysis, the other workers read its results.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import loudness
+from audio_metadata import read_metadata
+from music_library import library
+
+CATALOG_FILE = os.getenv(
+    'CATALOG_FILE', os.path.join(os.getenv('CACHE_FOLDER', './cache'), 'catalog.sqlite3')
+)
+# Cluster 0 (or a single process) owns the database
+PRIMARY = os.getenv('CLUSTER_ID', '0') == '0'
+# How often a secondary worker looks for analysis results of a track
+REFRESH_INTERVAL = 30.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tracks (
+    path TEXT PRIMARY KEY,
+    mtime REAL NOT NULL,
+    size INTEGER NOT NULL,
+    duration REAL,
+    bitrate INTEGER,
+    sample_rate INTEGER,
+    channels INTEGER,
+    tags TEXT
+)
+"""
+
+# Columns added after the first release, migrated in place
+_ADDED_COLUMNS = {
+    'loudness': 'REAL',
+    'peak': 'REAL',
+    'lead_silence': 'REAL',
+    'trail_silence': 'REAL',
+    'analyzed': 'INTEGER NOT NULL DEFAULT 0',
+}
+
+_COLUMNS = (
+    'path', 'mtime', 'size', 'duration', 'bitrate', 'sample_rate', 'channels', 'tags'
+) + tuple(_ADDED_COLUMNS)
+_LOUDNESS_COLUMNS = ('loudness', 'peak', 'lead_silence', 'trail_silence')
+
+
+class Catalog:
+    """SQLite-backed metadata store with an in-memory read cache"""
+
+    def __init__(self, source, db_file=CATALOG_FILE, workers=2, primary=PRIMARY):
+        self.source = source
+        self.db_file = db_file
+        self.primary = primary
+        self._lock = threading.Lock()
+        self._rows = {}
+        self._pending = set()
+        self._checked = {}  # path -> last analysis lookup, secondary workers only
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='catalog')
+        # One ffmpeg analysis at a time so playback keeps most of the budget
+        self._analysis_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='loudness')
+        self._db = None
+
+    def _connect(self):
+        os.makedirs(os.path.dirname(self.db_file), exist_ok=True)
+        db = sqlite3.connect(self.db_file, check_same_thread=False)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute(_SCHEMA)
+        existing = {info[1] for info in db.execute("PRAGMA table_info(tracks)")}
+        for column, definition in _ADDED_COLUMNS.items():
+            if column not in existing:
+                db.execute(f"ALTER TABLE tracks ADD COLUMN {column} {definition}")
+        db.commit()
+        return db
+
+    def start(self):
+        """Load stored rows, then parse anything new or changed in the background"""
+        with self._lock:
+            self._db = self._connect()
+            for values in self._db.execute(f"SELECT {', '.join(_COLUMNS)} FROM tracks"):
+                row = dict(zip(_COLUMNS, values))
+                row['tags'] = json.loads(row['tags'] or '{}')
+                self._rows[row['path']] = row
+        self.source.add_listener(self._on_library_change)
+        self._sync(self.source.tracks(), ())
+
+        # Resume loudness analysis left unfinished by a previous run
+        if loudness.NORMALIZE and self.primary:
+            for track in self.source.tracks():
+                row = self.get(track)
+                if row is not None and row['analyzed'] < loudness.ANALYSIS_VERSION:
+                    self._analysis_executor.submit(self._analyze, track)
+
+    def _on_library_change(self, source, added, removed):
+        self._sync(added, removed)
+
+    def _sync(self, added, removed):
+        with self._lock:
+            for track in removed:
+                if self._rows.pop(track.path, None) is not None and self._db is not None and self.primary:
+                    self._db.execute("DELETE FROM tracks WHERE path = ?", (track.path,))
+            if removed and self._db is not None and self.primary:
+                self._db.commit()
+            stale = [
+                track for track in added
+                if track.path not in self._pending and (
+                    track.path not in self._rows or self._rows[track.path]['mtime'] != track.mtime
+                )
+            ]
+            self._pending.update(track.path for track in stale)
+        for track in stale:
+            self._executor.submit(self._parse, track)
+
+    def _parse(self, track):
+        try:
+            info = read_metadata(track.path)
+        except Exception as e:
+            print(f"Metadata parse failed for {track.name}: {e}")
+            info = {"tags": {}}
+        row = {
+            'path': track.path,
+            'mtime': track.mtime,
+            'size': track.size,
+            'duration': info.get('duration'),
+            'bitrate': info.get('bitrate'),
+            'sample_rate': info.get('sample_rate'),
+            'channels': info.get('channels'),
+            'tags': info.get('tags', {}),
+            'loudness': None,
+            'peak': None,
+            'lead_silence': None,
+            'trail_silence': None,
+            'analyzed': 0,
+        }
+        with self._lock:
+            self._pending.discard(track.path)
+            self._rows[track.path] = row
+            if self._db is not None and self.primary:
+                values = [json.dumps(row['tags']) if col == 'tags' else row[col] for col in _COLUMNS]
+                self._db.execute(
+                    f"INSERT OR REPLACE INTO tracks ({', '.join(_COLUMNS)}) "
+                    f"VALUES ({', '.join('?' * len(_COLUMNS))})",
+                    values
+                )
+                self._db.commit()
+        if loudness.NORMALIZE and self.primary:
+            self._analysis_executor.submit(self._analyze, track)
+
+    def _analyze(self, track):
+        row = self.get(track)
+        if row is None or row['analyzed'] >= loudness.ANALYSIS_VERSION:
+            return
+        try:
+            measured = loudness.analyze(track.path, row['duration'])
+        except Exception as e:
+            print(f"Loudness analysis failed for {track.name}: {e}")
+            return
+        with self._lock:
+            # The file may have changed while ffmpeg was running
+            if self._rows.get(track.path) is not row:
+                return
+            row.update(measured)
+            row['analyzed'] = loudness.ANALYSIS_VERSION
+            if self._db is not None:
+                self._db.execute(
+                    f"UPDATE tracks SET {', '.join(f'{col} = ?' for col in _LOUDNESS_COLUMNS)}, analyzed = ? "
+                    "WHERE path = ?",
+                    [row[col] for col in _LOUDNESS_COLUMNS] + [row['analyzed'], track.path]
+                )
+                self._db.commit()
+        print(f"Analyzed loudness for {track.name}: {row['loudness']} LUFS, peak {row['peak']} dBTP")
+
+    def get(self, track):
+        """Metadata row for a library Track, or None if not parsed yet"""
+        row = self._rows.get(track.path)
+        if row is None or row['mtime'] != track.mtime:
+            return None
+        if not self.primary and loudness.NORMALIZE and row['analyzed'] < loudness.ANALYSIS_VERSION:
+            self._load_analysis(row)
+        return row
+
+    def _load_analysis(self, row):
+        """Pick up loudness measurements written by the primary worker"""
+        now = time.monotonic()
+        with self._lock:
+            last = self._checked.get(row['path'], -REFRESH_INTERVAL)
+            if self._db is None or now - last < REFRESH_INTERVAL:
+                return
+            self._checked[row['path']] = now
+            stored = self._db.execute(
+                f"SELECT {', '.join(_LOUDNESS_COLUMNS)}, analyzed FROM tracks WHERE path = ? AND mtime = ?",
+                (row['path'], row['mtime'])
+            ).fetchone()
+        if stored is not None and stored[-1] >= loudness.ANALYSIS_VERSION:
+            row.update(zip(_LOUDNESS_COLUMNS + ('analyzed',), stored))
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._rows), "pending": len(self._pending)}
+
+
+def format_duration(seconds):
+    """Render seconds as m:ss or h:mm:ss"""
+    if seconds is None:
+        return None
+    seconds = int(round(seconds))
+    hours, rest = divmod(seconds, 3600)
+    minutes, secs = divmod(rest, 60)
+    if hours:
+        return f"{hours}:{minutes:02d}:{secs:02d}"
+    return f"{minutes}:{secs:02d}"
+
+
+# Shared catalog over the shared library
+catalog = Catalog(library)
@@ -0,0 +1,231 @@
+"""
+Multi-process shard clusters
+Splits the bot's shards across several worker processes on one host. Each
+worker runs render_main.py with its own SHARD_IDS, event loop, voice
+sessions, keep-alive port and cache folder (only the metadata catalog is
+shared). The launcher restarts workers that exit and serves one dashboard
+that aggregates every worker's health.
+"""
+
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+import urllib.request
+
+from aiohttp import ClientSession, ClientTimeout, web
+
+GATEWAY_URL = 'https://discord.com/api/v10/gateway/bot'
+# Discord allows max_concurrency identifies per 5 seconds
+IDENTIFY_WINDOW = 5.0
+RESTART_DELAY = 10.0
+CACHE_FOLDER = os.getenv('CACHE_FOLDER', './cache')
+CATALOG_FILE = os.getenv('CATALOG_FILE', os.path.join(CACHE_FOLDER, 'catalog.sqlite3'))
+OPUS_CACHE_MAX_MB = int(os.getenv('OPUS_CACHE_MAX_MB', '1024'))
+
+
+def gateway_info(token):
+    """Recommended shard count and identify concurrency for the bot token"""
+    request = urllib.request.Request(GATEWAY_URL, headers={
+        'Authorization': f'Bot {token}',
+        'User-Agent': 'DiscordBot (botmusique, 1.0)',
+    })
+    with urllib.request.urlopen(request, timeout=10) as response:
+        data = json.load(response)
+    return data['shards'], data.get('session_start_limit', {}).get('max_concurrency', 1)
+
+
+def split_shards(shard_count, clusters):
+    """Contiguous shard ID ranges, one per cluster"""
+    clusters = max(1, min(clusters, shard_count))
+    base, extra = divmod(shard_count, clusters)
+    ranges = []
+    start = 0
+    for i in range(clusters):
+        size = base + (1 if i < extra else 0)
+        ranges.append(list(range(start, start + size)))
+        start += size
+    return ranges
+
+
+class Worker:
+    """One cluster process and the shards it owns"""
+
+    def __init__(self, cluster_id, shard_ids, shard_count, port, cache_max_mb):
+        self.cluster_id = cluster_id
+        self.shard_ids = shard_ids
+        self.shard_count = shard_count
+        self.port = port
+        self.cache_max_mb = cache_max_mb
+        self.process = None
+        self.started_at = None
+        self.restarts = 0
+
+    def start(self):
+        env = dict(os.environ)
+        env.update({
+            'CLUSTER_ID': str(self.cluster_id),
+            'SHARD_COUNT': str(self.shard_count),
+            'SHARD_IDS': ','.join(str(i) for i in self.shard_ids),
+            'CLUSTER_PORT': str(self.port),
+            # Opus, seek and soundboard files are indexed per process: give each
+            # worker its own folder and share of the size cap. The catalog stays
+            # shared, with cluster 0 doing the analysis (see catalog.py)
+            'CACHE_FOLDER': os.path.join(CACHE_FOLDER, f'cluster-{self.cluster_id}'),
+            'CATALOG_FILE': CATALOG_FILE,
+            'OPUS_CACHE_MAX_MB': str(self.cache_max_mb),
+        })
+        script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'render_main.py')
+        self.process = subprocess.Popen([sys.executable, script], env=env)
+        self.started_at = time.time()
+        print(f"🧩 Cluster {self.cluster_id} started (pid {self.process.pid}, shards {self.shard_ids})")
+
+    def alive(self):
+        return self.process is not None and self.process.poll() is None
+
+    def stop(self):
+        if self.alive():
+            self.process.terminate()
+
+
+class ClusterLauncher:
+    """Starts, supervises and reports on the cluster workers"""
+
+    def __init__(self, clusters, port, token):
+        self.clusters = clusters
+        self.port = port
+        self.token = token
+        self.workers = []
+        self.max_concurrency = 1
+
+    async def start_workers(self):
+        shard_count = int(os.getenv('SHARD_COUNT', '0'))
+        try:
+            recommended, self.max_concurrency = await asyncio.to_thread(gateway_info, self.token)
+        except Exception as e:
+            print(f"⚠️ Could not query the gateway for a shard count: {e}")
+            recommended = self.clusters
+        shard_count = shard_count or max(recommended, self.clusters)
+
+        ranges = split_shards(shard_count, self.clusters)
+        cache_max_mb = max(1, OPUS_CACHE_MAX_MB // len(ranges))
+        for cluster_id, shard_ids in enumerate(ranges):
+            worker = Worker(cluster_id, shard_ids, shard_count, self.port + 1 + cluster_id, cache_max_mb)
+            self.workers.append(worker)
+            worker.start()
+            # Give this cluster's shards time to identify before the next one starts
+            await asyncio.sleep(IDENTIFY_WINDOW * -(-len(shard_ids) // self.max_concurrency))
+
+    async def supervise(self):
+        """Restart workers that exit"""
+        while True:
+            await asyncio.sleep(RESTART_DELAY)
+            for worker in self.workers:
+                if not worker.alive():
+                    print(f"⚠️ Cluster {worker.cluster_id} exited with {worker.process.returncode}, restarting")
+                    worker.restarts += 1
+                    worker.start()
+
+    async def cluster_status(self, session, worker):
+        info = {
+            "cluster": worker.cluster_id,
+            "shards": worker.shard_ids,
+            "pid": worker.process.pid if worker.process else None,
+            "alive": worker.alive(),
+            "restarts": worker.restarts,
+            "port": worker.port,
+        }
+        try:
+            async with session.get(f'http://127.0.0.1:{worker.port}/api/status') as response:
+                info["status"] = await response.json()
+        except Exception as e:
+            info["status"] = None
+            info["error"] = str(e)
+        return info
+
+    async def collect(self):
+        async with ClientSession(timeout=ClientTimeout(total=3)) as session:
+            return await asyncio.gather(*(self.cluster_status(session, w) for w in self.workers))
+
+    def app(self):
+        routes = web.RouteTableDef()
+
+        @routes.get('/api/clusters')
+        async def clusters(request):
+            return web.json_response(await self.collect())
+
+        @routes.get('/health')
+        async def health(request):
+            """Healthy only when every cluster answers and reports ready"""
+            clusters = await self.collect()
+            healthy = all(c["alive"] and c["status"] and c["status"].get("bot_online") for c in clusters)
+            return web.json_response(
+                {"status": "healthy" if healthy else "degraded", "clusters": clusters},
+                status=200 if healthy else 503
+            )
+
+        @routes.get('/')
+        async def dashboard(request):
+            rows = []
+            for c in await self.collect():
+                status = c["status"] or {}
+                rows.append(
+                    f"<tr><td>{c['cluster']}</td><td>{', '.join(map(str, c['shards']))}</td>"
+                    f"<td>{'🟢' if c['alive'] and status.get('bot_online') else '🔴'}</td>"
+                    f"<td>{status.get('guild_count', '-')}</td><td>{status.get('latency_ms', '-')}</td>"
+                    f"<td>{status.get('voice_sessions', '-')}</td><td>{status.get('playing_sessions', '-')}</td>"
+                    f"<td>{c['restarts']}</td></tr>"
+                )
+            return web.Response(content_type='text/html', text=f"""
+    <html>
+        <head>
+            <title>Discord Music Bot - Clusters</title>
+            <meta http-equiv="refresh" content="10">
+            <style>
+                body {{ font-family: Arial, sans-serif; max-width: 900px; margin: 0 auto; padding: 20px;
+                        background-color: #2c2f33; color: #ffffff; }}
+                table {{ width: 100%; border-collapse: collapse; }}
+                th, td {{ padding: 8px; border-bottom: 1px solid #40444b; text-align: left; }}
+            </style>
+        </head>
+        <body>
+            <h1>🧩 Clusters</h1>
+            <table>
+                <tr><th>Cluster</th><th>Shards</th><th>Statut</th><th>Serveurs</th><th>Latence (ms)</th>
+                    <th>Vocal</th><th>Lecture</th><th>Redémarrages</th></tr>
+                {''.join(rows)}
+            </table>
+        </body>
+    </html>
+    """)
+
+        app = web.Application()
+        app.add_routes(routes)
+        return app
+
+    async def run(self):
+        runner = web.AppRunner(self.app(), access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, host='0.0.0.0', port=self.port).start()
+        print(f"🌐 Cluster dashboard started on http://0.0.0.0:{self.port}")
+        try:
+            await self.start_workers()
+            await self.supervise()
+        finally:
+            for worker in self.workers:
+                worker.stop()
+            await runner.cleanup()
+
+
+def run_clusters(clusters, port):
+    """Block running the launcher until interrupted"""
+    token = os.getenv('DISCORD_TOKEN')
+    if not token:
+        print("❌ DISCORD_TOKEN environment variable not set!")
+        return
+    try:
+        asyncio.run(ClusterLauncher(clusters, port, token).run())
+    except KeyboardInterrupt:
+        pass
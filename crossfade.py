@@ -0,0 +1,140 @@
+"""
+Crossfading track chain
+One audio source that plays a track, then the next one from the queue,
+without going back through voice_client.play. Over the last seconds of a
+track both are decoded to PCM, faded with equal-power ramps applied to
+whole 20 ms blocks at once, and re-encoded; outside the overlap the
+tracks' Opus packets pass straight through.
+"""
+
+import os
+
+import discord
+import numpy as np
+
+from mixer import CHANNELS, SAMPLES_PER_FRAME, PCMStream
+
+# Default overlap between tracks in seconds; 0 keeps hard transitions
+DEFAULT_SECONDS = float(os.getenv('CROSSFADE_SECONDS', '0'))
+MAX_SECONDS = 12.0
+
+
+def fade_ramps(frames):
+    """Equal-power fade-out and fade-in gains, one per sample, shaped (frames, samples, 1)"""
+    t = np.linspace(0.0, 1.0, frames * SAMPLES_PER_FRAME, dtype=np.float32)
+    fade_out = np.cos(t * np.float32(np.pi / 2))
+    fade_in = np.sin(t * np.float32(np.pi / 2))
+    shape = (frames, SAMPLES_PER_FRAME, 1)
+    return fade_out.reshape(shape), fade_in.reshape(shape)
+
+
+def crossfade_block(outgoing, incoming, fade_out, fade_in):
+    """Blend two interleaved int16 blocks with per-sample gains"""
+    a = outgoing.reshape(SAMPLES_PER_FRAME, CHANNELS) * fade_out
+    b = incoming.reshape(SAMPLES_PER_FRAME, CHANNELS) * fade_in
+    # Equal-power gains never sum above sqrt(2); clip the rare overshoot
+    return np.clip(a + b, -32768, 32767).astype(np.int16)
+
+
+class CrossfadeSource(discord.AudioSource):
+    """Track chain with overlapping transitions
+
+    next_track() is called from the audio thread when the current track is
+    within the fade window (or has ended) and returns (source, frames) for
+    the next track, or None. on_advance(source) is called once the next
+    track has taken over.
+    """
+
+    def __init__(self, source, frames, fade_frames, next_track, on_advance):
+        self.current = source
+        self.remaining = frames  # frames left in the current track, None if unknown
+        self.fade_frames = fade_frames
+        self.next_track = next_track
+        self.on_advance = on_advance
+        self._fade_out, self._fade_in = fade_ramps(fade_frames)
+        self._incoming = None
+        self._incoming_frames = None
+        # Next track too short to fade into, played after a hard cut instead
+        self._cut_to = None
+        self._outgoing_stream = None
+        self._incoming_stream = None
+        self._step = 0
+        self._encoder = None
+
+    def _begin_fade(self):
+        upcoming = self.next_track()
+        if upcoming is None:
+            return False
+        if upcoming[1] is not None and upcoming[1] < self.fade_frames:
+            # It would end before the fade does
+            self._cut_to = upcoming
+            return False
+        self._incoming, self._incoming_frames = upcoming
+        self._outgoing_stream = PCMStream(self.current)
+        self._incoming_stream = PCMStream(self._incoming)
+        self._step = 0
+        return True
+
+    def _advance(self):
+        """The incoming track becomes the current one"""
+        if self.current is not None:
+            self.current.cleanup()
+        self.current = self._incoming
+        self.remaining = self._incoming_frames
+        if self.remaining is not None:
+            self.remaining -= self._step
+        self._incoming = self._outgoing_stream = self._incoming_stream = None
+        self.on_advance(self.current)
+
+    def _encode(self, block):
+        if self._encoder is None:
+            self._encoder = discord.opus.Encoder()
+        return self._encoder.encode(block.tobytes(), SAMPLES_PER_FRAME)
+
+    def read(self):
+        if self.current is None:
+            return b''
+
+        if self._incoming is None:
+            if self.remaining is not None and self.remaining <= self.fade_frames:
+                if not self._begin_fade():
+                    # Nothing to fade into: don't ask again on every frame
+                    self.remaining = None
+            if self._incoming is None:
+                packet = self.current.read()
+                if self.remaining is not None:
+                    self.remaining -= 1
+                if packet:
+                    return packet
+                # Ended earlier than expected or without a duration: gapless cut
+                upcoming, self._cut_to = self._cut_to or self.next_track(), None
+                if upcoming is None:
+                    return b''
+                self._incoming, self._incoming_frames = upcoming
+                self._step = 0
+                self._advance()
+                return self.current.read()
+
+        outgoing = self._outgoing_stream.read_pcm()
+        incoming = self._incoming_stream.read_pcm()
+        if incoming is None:
+            # Shorter than its duration said: it has been heard, move past it
+            self._advance()
+            return self.read()
+        if outgoing is None:
+            outgoing = np.zeros_like(incoming)
+        block = crossfade_block(outgoing, incoming, self._fade_out[self._step], self._fade_in[self._step])
+        self._step += 1
+        if self._step >= self.fade_frames:
+            self._advance()
+        return self._encode(block)
+
+    def is_opus(self):
+        return True
+
+    def cleanup(self):
+        cut_to = self._cut_to[0] if self._cut_to else None
+        for source in (self.current, self._incoming, cut_to):
+            if source is not None:
+                source.cleanup()
+        self.current = self._incoming = self._cut_to = None
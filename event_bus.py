@@ -0,0 +1,59 @@
+"""
+In-process event bus for dashboard push updates
+Playback, voice and library changes are published here from any thread and
+fanned out to the asyncio queues of connected dashboard streams.
+"""
+
+import asyncio
+
+# Events kept per subscriber before the oldest are dropped
+QUEUE_SIZE = 100
+
+
+class EventBus:
+    """Thread-safe publish, asyncio-side subscribe"""
+
+    def __init__(self):
+        self._subscribers = set()
+        self._loop = None
+
+    def bind(self, loop):
+        """Attach the bus to the event loop that owns the subscribers"""
+        self._loop = loop
+
+    def subscribe(self):
+        queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue):
+        self._subscribers.discard(queue)
+
+    @property
+    def subscriber_count(self):
+        return len(self._subscribers)
+
+    def publish(self, event, data=None):
+        """Send an event to every subscriber; safe to call from any thread"""
+        loop = self._loop
+        if loop is None or loop.is_closed() or not self._subscribers:
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            self._dispatch(event, data)
+            return
+        loop.call_soon_threadsafe(self._dispatch, event, data)
+
+    def _dispatch(self, event, data):
+        for queue in list(self._subscribers):
+            if queue.full():
+                # Slow consumer: drop its oldest event rather than block everyone
+                queue.get_nowait()
+            queue.put_nowait((event, data))
+
+
+# Shared bus
+events = EventBus()
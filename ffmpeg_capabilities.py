@@ -0,0 +1,147 @@
+"""
+Cached ffmpeg capability registry
+Probes the ffmpeg binary once (path, version, codec support) and persists
+the result to disk keyed by the binary's size and mtime, so restarts and
+health endpoints never need to fork ffmpeg just to know it is there.
+"""
+
+import json
+import os
+import shutil
+import subprocess
+import threading
+import time
+
+CAPABILITIES_FILE = os.path.join(os.getenv('CACHE_FOLDER', './cache'), 'ffmpeg_capabilities.json')
+
+# Codecs the bot cares about
+ENCODERS = ('libopus',)
+DECODERS = ('mp3', 'opus', 'vorbis')
+
+
+def _binary_signature(path):
+    stat = os.stat(path)
+    return f"{os.path.realpath(path)}|{stat.st_size}|{stat.st_mtime_ns}"
+
+
+def _codec_listed(output, name):
+    """True if a codec name appears as a column in `ffmpeg -encoders/-decoders` output"""
+    return any(line.split()[1:2] == [name] for line in output.splitlines() if line.strip())
+
+
+class FFmpegCapabilities:
+    """Process-wide snapshot of what the installed ffmpeg can do"""
+
+    def __init__(self, cache_file=CAPABILITIES_FILE):
+        self.cache_file = cache_file
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._refresh_thread = None
+
+    def _empty(self):
+        return {
+            "available": False,
+            "path": None,
+            "version": None,
+            "encoders": {name: False for name in ENCODERS},
+            "decoders": {name: False for name in DECODERS},
+            "signature": None,
+            "checked_at": time.time(),
+        }
+
+    def _load_persisted(self, signature):
+        try:
+            with open(self.cache_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if data.get("signature") != signature:
+            return None
+        return data
+
+    def _persist(self, snapshot):
+        try:
+            os.makedirs(os.path.dirname(self.cache_file), exist_ok=True)
+            tmp_path = self.cache_file + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(snapshot, f)
+            os.replace(tmp_path, self.cache_file)
+        except OSError as e:
+            print(f"Could not persist ffmpeg capabilities: {e}")
+
+    def _probe(self, path, signature):
+        """Run ffmpeg to fill a fresh snapshot"""
+        snapshot = self._empty()
+        try:
+            version = subprocess.run([path, '-version'], capture_output=True, text=True, check=True)
+            encoders = subprocess.run([path, '-hide_banner', '-encoders'], capture_output=True, text=True)
+            decoders = subprocess.run([path, '-hide_banner', '-decoders'], capture_output=True, text=True)
+        except (subprocess.CalledProcessError, OSError) as e:
+            print(f"FFmpeg probe failed: {e}")
+            return snapshot
+
+        snapshot.update({
+            "available": True,
+            "path": path,
+            "version": version.stdout.split('\n')[0],
+            "encoders": {name: _codec_listed(encoders.stdout, name) for name in ENCODERS},
+            "decoders": {name: _codec_listed(decoders.stdout, name) for name in DECODERS},
+            "signature": signature,
+        })
+        return snapshot
+
+    def refresh(self, force=False):
+        """Re-check the binary; only fork ffmpeg if it changed or was never probed"""
+        path = shutil.which('ffmpeg')
+        with self._lock:
+            if path is None:
+                self._snapshot = self._empty()
+                return self._snapshot
+            try:
+                signature = _binary_signature(path)
+            except OSError:
+                self._snapshot = self._empty()
+                return self._snapshot
+
+            if not force and self._snapshot and self._snapshot.get("signature") == signature:
+                return self._snapshot
+
+            snapshot = None if force else self._load_persisted(signature)
+            if snapshot is None:
+                snapshot = self._probe(path, signature)
+                if snapshot["available"]:
+                    self._persist(snapshot)
+            snapshot["checked_at"] = time.time()
+            self._snapshot = snapshot
+            return snapshot
+
+    def snapshot(self):
+        """Latest known capabilities, probing only on first use"""
+        snapshot = self._snapshot
+        if snapshot is None:
+            snapshot = self.refresh()
+        return snapshot
+
+    @property
+    def available(self):
+        return self.snapshot()["available"]
+
+    def start_background_refresh(self, interval=300):
+        """Keep the snapshot fresh without blocking request handlers"""
+        if self._refresh_thread is not None:
+            return
+
+        def loop():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.refresh()
+                except Exception as e:
+                    print(f"FFmpeg capability refresh failed: {e}")
+
+        self._refresh_thread = threading.Thread(target=loop, daemon=True, name='ffmpeg-capabilities')
+        self._refresh_thread.start()
+
+
+# Shared registry
+capabilities = FFmpegCapabilities()
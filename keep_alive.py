@@ -1,12 +1,24 @@
-from flask import Flask
-from threading import Thread
+from aiohttp import web
+import asyncio
+import datetime
+import json
 import os
+from music_library import library
+from transcoder import transcoder
+from ffmpeg_capabilities import capabilities
+from voice_sessions import sessions
+from event_bus import events
+from catalog import catalog, format_duration
+import metrics
 
-app = Flask('')
+routes = web.RouteTableDef()
 
-@app.route('/')
-def home():
-    return """
+# Set by start_server() so handlers can read live bot state
+bot = None
+
+@routes.get('/')
+async def home(request):
+    return web.Response(text="""
     <html>
         <head>
             <title>Discord Music Bot - Keep Alive</title>
@@ -72,10 +84,15 @@ def home():
                     <h3>🎮 Commandes Disponibles</h3>
                     <div class="command">!aide - Interface interactive avec boutons</div>
                     <div class="command">!join - Rejoindre votre canal vocal</div>
-                    <div class="command">!play &lt;fichier&gt; - Jouer un fichier MP3</div>
-                    <div class="command">!stop - Arrêter la lecture</div>
+                    <div class="command">!play &lt;fichier&gt; - Jouer un fichier MP3, Opus ou Ogg</div>
+                    <div class="command">!queue [fichier] - Ajouter à la file / voir la file</div>
+                    <div class="command">!skip - Passer au morceau suivant</div>
+                    <div class="command">!next &lt;fichier&gt; - Jouer juste après le morceau en cours</div>
+                    <div class="command">!seek &lt;temps&gt; - Aller à une position (ex. 1:30)</div>
+                    <div class="command">!stop - Arrêter la lecture et vider la file</div>
+                    <div class="command">!resume - Reprendre là où la lecture s'est arrêtée</div>
                     <div class="command">!leave - Quitter le canal vocal</div>
-                    <div class="command">!list - Voir les fichiers MP3 disponibles</div>
+                    <div class="command">!list - Voir les fichiers audio disponibles</div>
                     <div class="command">!status - Statut du bot</div>
                 </div>
                 
@@ -89,7 +106,7 @@ def home():
                 
                 <div class="info">
                     <h3>📁 Music Files</h3>
-                    <p>Upload your MP3 files to the <code>music/</code> folder in your Replit project.</p>
+                    <p>Upload your MP3, Opus or Ogg files to the <code>music/</code> folder in your Replit project.</p>
                     <p>Files remain private and are only accessible through bot commands.</p>
                 </div>
                 
@@ -121,21 +138,21 @@ def home():
             </div>
         </body>
     </html>
-    """
+    """, content_type='text/html')
 
-@app.route('/status')
-def status():
+@routes.get('/status')
+async def status(request):
     """Simple status endpoint for monitoring"""
-    return {
+    return web.json_response({
         "status": "online",
         "service": "discord-music-bot",
         "uptime": True
-    }
+    })
 
-@app.route('/dashboard')
-def dashboard():
+@routes.get('/dashboard')
+async def dashboard(request):
     """Dashboard page with live bot status and music list"""
-    return """
+    return web.Response(text="""
     <html>
         <head>
             <title>Discord Music Bot - Dashboard</title>
@@ -247,28 +264,31 @@ def dashboard():
             </div>
 
             <script>
+                function renderStatus(data) {
+                    const statusDiv = document.getElementById('bot-status');
+                    const infoDiv = document.getElementById('bot-info');
+                    
+                    let statusClass = data.bot_online ? 'online' : 'offline';
+                    let statusText = data.bot_online ? 'En ligne' : 'Hors ligne';
+                    
+                    statusDiv.innerHTML = `
+                        <div><span class="status-indicator ${statusClass}"></span>${statusText}</div>
+                        <div>Connexion vocale: ${data.voice_connected ? `✅ Connecté (${data.voice_sessions} serveur(s))` : '❌ Non connecté'}</div>
+                        <div>Audio en cours: ${data.audio_playing ? `🎵 Oui (${data.playing_sessions} serveur(s))` : '⏹️ Non'}</div>
+                        <div>Serveurs: ${data.guild_count}</div>
+                    `;
+                    
+                    infoDiv.innerHTML = `
+                        <p>📁 Fichiers audio: ${data.music_count}</p>
+                        <p>🔧 FFmpeg: ${data.ffmpeg_available ? '✅ Disponible' : '❌ Indisponible'}</p>
+                        <p>🔑 Token Discord: ${data.discord_token ? '✅ Configuré' : '❌ Manquant'}</p>
+                    `;
+                }
+
                 function updateStatus() {
                     fetch('/api/status')
                         .then(response => response.json())
-                        .then(data => {
-                            const statusDiv = document.getElementById('bot-status');
-                            const infoDiv = document.getElementById('bot-info');
-                            
-                            let statusClass = data.bot_online ? 'online' : 'offline';
-                            let statusText = data.bot_online ? 'En ligne' : 'Hors ligne';
-                            
-                            statusDiv.innerHTML = `
-                                <div><span class="status-indicator ${statusClass}"></span>${statusText}</div>
-                                <div>Connexion vocale: ${data.voice_connected ? '✅ Connecté' : '❌ Non connecté'}</div>
-                                <div>Audio en cours: ${data.audio_playing ? '🎵 Oui' : '⏹️ Non'}</div>
-                            `;
-                            
-                            infoDiv.innerHTML = `
-                                <p>📁 Fichiers MP3: ${data.music_count}</p>
-                                <p>🔧 FFmpeg: ${data.ffmpeg_available ? '✅ Disponible' : '❌ Indisponible'}</p>
-                                <p>🔑 Token Discord: ${data.discord_token ? '✅ Configuré' : '❌ Manquant'}</p>
-                            `;
-                        })
+                        .then(renderStatus)
                         .catch(error => {
                             document.getElementById('bot-status').innerHTML = 
                                 '<div><span class="status-indicator offline"></span>Erreur de connexion</div>';
@@ -286,6 +306,8 @@ def dashboard():
                                 const musicGrid = data.files.map(file => `
                                     <div class="music-item">
                                         <strong>🎵 ${file.name}</strong><br>
+                                        ${file.artist ? `<small>Artiste: ${file.artist}</small><br>` : ''}
+                                        ${file.duration ? `<small>Durée: ${file.duration} • ${file.bitrate} kbps</small><br>` : ''}
                                         <small>Taille: ${file.size}</small><br>
                                         <small>Ajouté: ${file.date}</small>
                                     </div>
@@ -293,7 +315,7 @@ def dashboard():
                                 
                                 musicDiv.innerHTML = `<div class="music-grid">${musicGrid}</div>`;
                             } else {
-                                musicDiv.innerHTML = '<p>📁 Aucun fichier MP3 trouvé dans le dossier music/</p>';
+                                musicDiv.innerHTML = '<p>📁 Aucun fichier audio trouvé dans le dossier music/</p>';
                             }
                             
                             updateDiv.innerHTML = `Dernière mise à jour: ${new Date().toLocaleString('fr-FR')}`;
@@ -304,133 +326,268 @@ def dashboard():
                         });
                 }
 
-                // Auto-refresh every 30 seconds
-                setInterval(() => {
+                // Live updates pushed by the server, no polling
+                function connectEvents() {
+                    const source = new EventSource('/api/events');
+                    
+                    // (Re)connected: resync everything once
+                    source.onopen = () => {
+                        updateStatus();
+                        updateMusicList();
+                    };
+                    
+                    ['track_start', 'track_stop', 'voice'].forEach(name => {
+                        source.addEventListener(name, event => {
+                            renderStatus(JSON.parse(event.data).status);
+                        });
+                    });
+                    
+                    source.addEventListener('library', () => {
+                        updateStatus();
+                        updateMusicList();
+                    });
+                }
+
+                // Initial load happens in onopen when streaming is available
+                if (window.EventSource) {
+                    connectEvents();
+                } else {
+                    // Old browsers: fall back to polling
                     updateStatus();
                     updateMusicList();
-                }, 30000);
-
-                // Initial load
-                updateStatus();
-                updateMusicList();
+                    setInterval(() => {
+                        updateStatus();
+                        updateMusicList();
+                    }, 30000);
+                }
             </script>
         </body>
     </html>
-    """
+    """, content_type='text/html')
 
-@app.route('/api/status')
-def api_status():
+@routes.get('/api/status')
+async def api_status(request):
     """API endpoint for bot status"""
     try:
-        # Import here to avoid circular imports
-        import discord
-        import subprocess
-        
-        # Check if music folder exists and count files
-        music_count = 0
-        if os.path.exists('./music'):
-            music_count = len([f for f in os.listdir('./music') if f.endswith('.mp3')])
-        
-        # Check if FFmpeg is available
-        try:
-            subprocess.run(['ffmpeg', '-version'], capture_output=True, check=True)
-            ffmpeg_available = True
-        except:
-            ffmpeg_available = False
-        
-        return {
-            "bot_online": True,  # If this endpoint responds, bot is running
-            "voice_connected": False,  # This would need to be updated from main.py
-            "audio_playing": False,   # This would need to be updated from main.py
-            "music_count": music_count,
-            "ffmpeg_available": ffmpeg_available,
-            "discord_token": bool(os.getenv('DISCORD_TOKEN'))
-        }
+        return web.json_response(status_payload())
     except Exception as e:
-        return {
+        return web.json_response({
             "bot_online": False,
             "error": str(e)
-        }, 500
+        }, status=500)
 
-@app.route('/api/music')
-def api_music():
+@routes.get('/api/music')
+async def api_music(request):
     """API endpoint for music list"""
     try:
         music_files = []
         
-        if os.path.exists('./music'):
-            for filename in os.listdir('./music'):
-                if filename.endswith('.mp3'):
-                    filepath = os.path.join('./music', filename)
-                    stat = os.stat(filepath)
-                    
-                    # Format file size
-                    size_bytes = stat.st_size
-                    if size_bytes < 1024:
-                        size_str = f"{size_bytes} B"
-                    elif size_bytes < 1024**2:
-                        size_str = f"{size_bytes/1024:.1f} KB"
-                    else:
-                        size_str = f"{size_bytes/(1024**2):.1f} MB"
-                    
-                    # Format date
-                    import datetime
-                    date_str = datetime.datetime.fromtimestamp(stat.st_mtime).strftime('%d/%m/%Y %H:%M')
-                    
-                    music_files.append({
-                        'name': filename,
-                        'size': size_str,
-                        'date': date_str
-                    })
-        
-        # Sort by name
-        music_files.sort(key=lambda x: x['name'].lower())
+        # The index is already sorted by name and holds size/mtime
+        for track in library.tracks():
+            # Format file size
+            size_bytes = track.size
+            if size_bytes < 1024:
+                size_str = f"{size_bytes} B"
+            elif size_bytes < 1024**2:
+                size_str = f"{size_bytes/1024:.1f} KB"
+            else:
+                size_str = f"{size_bytes/(1024**2):.1f} MB"
+            
+            # Format date
+            date_str = datetime.datetime.fromtimestamp(track.mtime).strftime('%d/%m/%Y %H:%M')
+            
+            entry = {
+                'name': track.name,
+                'size': size_str,
+                'date': date_str
+            }
+            
+            # Filled in by the background catalog once the file is parsed
+            info = catalog.get(track)
+            if info is not None:
+                entry.update({
+                    'duration': format_duration(info['duration']),
+                    'bitrate': info['bitrate'],
+                    'sample_rate': info['sample_rate'],
+                    'title': info['tags'].get('title'),
+                    'artist': info['tags'].get('artist')
+                })
+            
+            music_files.append(entry)
         
-        return {
+        return web.json_response({
             "files": music_files,
             "count": len(music_files)
-        }
+        })
     except Exception as e:
-        return {
+        return web.json_response({
             "error": str(e),
             "files": []
-        }, 500
+        }, status=500)
+
+@routes.get('/api/events')
+async def api_events(request):
+    """Server-Sent Events stream of status and library changes"""
+    response = web.StreamResponse(headers={
+        "Content-Type": "text/event-stream",
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    })
+    await response.prepare(request)
+    
+    queue = events.subscribe()
+    try:
+        while True:
+            try:
+                event, data = await asyncio.wait_for(queue.get(), timeout=25)
+            except asyncio.TimeoutError:
+                # Comment line keeps proxies from closing an idle stream
+                await response.write(b": ping\n\n")
+                continue
+            
+            payload = {"event": event, "data": data}
+            if event != 'library':
+                payload["status"] = status_payload()
+            message = f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+            await response.write(message.encode('utf-8'))
+    except (ConnectionResetError, asyncio.CancelledError):
+        pass
+    finally:
+        events.unsubscribe(queue)
+    return response
 
-@app.route('/health')
-def health_check():
+@routes.get('/health')
+async def health_check(request):
     """Health check endpoint"""
     try:
         # Check if music folder exists
-        music_folder_exists = os.path.exists('./music')
+        music_folder_exists = library.exists
         
-        # Check if FFmpeg is available
-        import subprocess
-        try:
-            subprocess.run(['ffmpeg', '-version'], capture_output=True, check=True)
-            ffmpeg_available = True
-        except:
-            ffmpeg_available = False
+        # FFmpeg availability comes from the background-refreshed snapshot
+        ffmpeg = capabilities.snapshot()
         
-        return {
+        return web.json_response({
             "status": "healthy",
             "music_folder": music_folder_exists,
-            "ffmpeg": ffmpeg_available,
+            "ffmpeg": ffmpeg["available"],
+            "ffmpeg_version": ffmpeg["version"],
+            "libopus": ffmpeg["encoders"].get("libopus", False),
             "discord_token": bool(os.getenv('DISCORD_TOKEN'))
-        }
+        })
     except Exception as e:
-        return {
+        return web.json_response({
             "status": "error",
             "error": str(e)
-        }, 500
+        }, status=500)
+
+def status_payload():
+    """Bot status shared by /api/status and the event stream"""
+    # Live voice state from the per-guild sessions
+    connected = sessions.connected()
+    playing = sessions.playing()
+    
+    return {
+        "bot_online": bot is not None and bot.is_ready(),
+        "guild_count": len(bot.guilds) if bot is not None else 0,
+        "latency_ms": round(bot.latency * 1000) if bot is not None and bot.is_ready() else None,
+        "cluster": os.getenv('CLUSTER_ID'),
+        "shards": shard_info(),
+        "voice_connected": bool(connected),
+        "audio_playing": bool(playing),
+        "voice_sessions": len(connected),
+        "playing_sessions": len(playing),
+        "sessions": [session_info(session) for session in connected],
+        # Count files from the shared library index
+        "music_count": len(library),
+        # FFmpeg availability comes from the background-refreshed snapshot
+        "ffmpeg_available": capabilities.snapshot()["available"],
+        "transcoders": transcoder.stats(),
+        "discord_token": bool(os.getenv('DISCORD_TOKEN'))
+    }
+
+def shard_info():
+    """Per-shard gateway state for this process"""
+    if bot is None or not hasattr(bot, 'shards'):
+        return []
+    return [
+        {
+            "id": shard_id,
+            "latency_ms": round(shard.latency * 1000) if shard.latency < float('inf') else None,
+            "closed": shard.is_closed(),
+        }
+        for shard_id, shard in sorted(bot.shards.items())
+    ]
+
+def session_info(session):
+    """JSON-friendly summary of one guild session"""
+    guild = bot.get_guild(session.guild_id) if bot is not None else None
+    return {
+        "guild_id": str(session.guild_id),
+        "guild": guild.name if guild else None,
+        "channel": session.channel.name if session.channel else None,
+        "playing": session.is_playing(),
+        "track": session.current_track,
+        "position": session.position(),
+        "queue": len(session.queue),
+        "volume": session.volume,
+        "send": session.send_stats.summary()
+    }
+
+def publish_library_change(library, added, removed):
+    events.publish('library', {
+        "added": [track.name for track in added],
+        "removed": [track.name for track in removed],
+        "count": len(library)
+    })
+
+@routes.get('/metrics')
+async def prometheus_metrics(request):
+    """Prometheus scrape endpoint"""
+    return web.Response(
+        text=metrics.registry.render(),
+        headers={'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+    )
+
+# Live state is read at scrape time rather than tracked on the hot path
+metrics.registry.register(metrics.Gauge(
+    'botmusique_voice_sessions', "Guilds with a voice connection", lambda: len(sessions.connected())
+))
+metrics.registry.register(metrics.Gauge(
+    'botmusique_playing_sessions', "Guilds currently sending audio", lambda: len(sessions.playing())
+))
+metrics.registry.register(metrics.Gauge(
+    'botmusique_transcoders_active', "Running ffmpeg processes", lambda: transcoder.stats()['active']
+))
+metrics.registry.register(metrics.Gauge(
+    'botmusique_transcoders_waiting', "Requests waiting for an ffmpeg slot", lambda: transcoder.stats()['waiting']
+))
+metrics.registry.register(metrics.Gauge(
+    'botmusique_library_tracks', "Audio files in the music library", lambda: len(library)
+))
 
-def run():
-    """Run the Flask server"""
-    # Bind to 0.0.0.0:5000 for Replit compatibility
-    app.run(host='0.0.0.0', port=5000, debug=False)
+async def watch_library(interval=5):
+    """Poll the folder mtime so library changes reach open dashboards"""
+    while True:
+        await asyncio.sleep(interval)
+        library.refresh()
 
-def keep_alive():
-    """Start the keep-alive server in a separate thread"""
-    t = Thread(target=run)
-    t.daemon = True
-    t.start()
-    print("🌐 Keep-alive server started on http://0.0.0.0:5000")
+async def start_server(discord_bot, port=5000):
+    """Start the keep-alive server on the bot's event loop"""
+    global bot
+    bot = discord_bot
+    
+    # Push updates to dashboards from this loop
+    events.bind(asyncio.get_running_loop())
+    library.add_listener(publish_library_change)
+    asyncio.create_task(watch_library())
+    asyncio.create_task(metrics.monitor_loop_lag())
+    
+    app = web.Application()
+    app.add_routes(routes)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    # Bind to 0.0.0.0 for Replit/Render compatibility
+    site = web.TCPSite(runner, host='0.0.0.0', port=port)
+    await site.start()
+    print(f"🌐 Keep-alive server started on http://0.0.0.0:{port}")
+    return runner
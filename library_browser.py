@@ -0,0 +1,218 @@
+"""
+Paginated library browser
+Shows the library one page at a time with a select menu for the visible
+tracks and previous/next buttons. Rendered pages are cached per library
+version, so paging through a large library never rebuilds unchanged pages.
+Components are stateless dynamic items registered once at startup: their
+custom IDs carry the page and mode, and select values carry stable track
+IDs, so no View is kept per message and old messages work after restarts.
+"""
+
+import discord
+from discord.ui import Button, DynamicItem, Select, View
+
+from music_library import library
+
+# Discord allows at most 25 options in a select menu
+PAGE_SIZE = 25
+# Discord caps embed descriptions at 4096 characters
+DESCRIPTION_LIMIT = 4096
+
+
+class Page:
+    """One rendered page of the library"""
+
+    __slots__ = ('number', 'count', 'total', 'tracks', 'listing', 'options')
+
+    def __init__(self, number, count, total, tracks):
+        self.number = number
+        self.count = count
+        self.total = total
+        self.tracks = tracks
+        self.listing = self._render_listing()
+        self.options = [
+            discord.SelectOption(label=_truncate(track.title, 100), value=track.id, emoji="🎵")
+            for track in tracks
+        ]
+
+    def _render_listing(self):
+        first = self.number * PAGE_SIZE
+        lines = []
+        length = 0
+        for i, track in enumerate(self.tracks, start=first + 1):
+            line = f"`{i}.` {_truncate(track.title, 120)}"
+            if length + len(line) + 1 > DESCRIPTION_LIMIT:
+                break
+            lines.append(line)
+            length += len(line) + 1
+        return "\n".join(lines)
+
+
+def _truncate(text, limit):
+    return text if len(text) <= limit else text[:limit - 3] + "..."
+
+
+class PageCache:
+    """Rendered pages, dropped whenever the library changes"""
+
+    def __init__(self, source):
+        self.source = source
+        self._version = None
+        self._pages = {}
+
+    def page_count(self):
+        return max(1, -(-len(self.source) // PAGE_SIZE))
+
+    def get(self, number):
+        tracks = self.source.tracks()
+        if self._version != self.source.version:
+            self._pages.clear()
+            self._version = self.source.version
+
+        count = self.page_count()
+        number = min(max(number, 0), count - 1)
+        page = self._pages.get(number)
+        if page is None:
+            start = number * PAGE_SIZE
+            page = Page(number, count, len(tracks), tracks[start:start + PAGE_SIZE])
+            self._pages[number] = page
+        return page
+
+
+pages = PageCache(library)
+
+
+# Browser flavours: public from !list, ephemeral from the !aide button
+MODES = {
+    'p': {"title": "🎵 Bibliothèque Musicale", "color": 0x7289da, "ephemeral": False},
+    'e': {"title": "🎵 Musiques Disponibles", "color": 0x43b581, "ephemeral": True},
+}
+
+# Set by setup_dispatcher(): on_play(interaction, filename, ephemeral), on_status(interaction)
+_handlers = {}
+
+
+def browser_embed(page, mode='p'):
+    style = MODES[mode]
+    embed = discord.Embed(
+        title=style["title"],
+        description=page.listing or "📁 Aucun fichier audio trouvé",
+        color=style["color"]
+    )
+    embed.set_footer(
+        text=f"Page {page.number + 1}/{page.count} • {page.total} fichiers • "
+             "Le bot rejoint automatiquement votre canal vocal"
+    )
+    return embed
+
+
+def browser_view(page, mode='p'):
+    """Components for one page; the View is only a container for sending"""
+    view = View(timeout=None)
+    select = TrackSelect(mode)
+    select.item.options = page.options or [discord.SelectOption(label="(vide)", value="-")]
+    select.item.disabled = not page.options
+    view.add_item(select)
+    view.add_item(PageButton(mode, 'prev', page.number, disabled=page.number == 0))
+    view.add_item(Button(
+        label=f"Page {page.number + 1}/{page.count}", style=discord.ButtonStyle.secondary,
+        disabled=True, custom_id=f"bm:label:{mode}", row=1
+    ))
+    view.add_item(PageButton(mode, 'next', page.number, disabled=page.number >= page.count - 1))
+    return view
+
+
+async def send_browser(send, page_number=0, mode='p', **kwargs):
+    """Send a browser page through send(embed=..., view=...)"""
+    page = pages.get(page_number)
+    view = browser_view(page, mode)
+    await send(embed=browser_embed(page, mode), view=view, **kwargs)
+    # Clicks are routed by the registered dynamic items, not by this view
+    view.stop()
+
+
+class TrackSelect(DynamicItem[Select], template=r'bm:pick:(?P<mode>[pe])'):
+    """Select menu whose values are track IDs"""
+
+    def __init__(self, mode):
+        super().__init__(Select(
+            placeholder="Choisissez une musique à jouer", custom_id=f"bm:pick:{mode}", row=0
+        ))
+        self.mode = mode
+
+    @classmethod
+    async def from_custom_id(cls, interaction, item, match):
+        return cls(match['mode'])
+
+    async def callback(self, interaction):
+        track = library.by_id(self.item.values[0]) if self.item.values else None
+        if track is None:
+            await interaction.response.send_message("❌ Ce fichier n'est plus disponible", ephemeral=True)
+            return
+        await _handlers['play'](interaction, track.name, MODES[self.mode]["ephemeral"])
+
+
+class PageButton(
+    DynamicItem[Button], template=r'bm:page:(?P<mode>[pe]):(?P<direction>prev|next):(?P<page>\d+)'
+):
+    """Previous/next button; the custom ID holds the page it was rendered on"""
+
+    def __init__(self, mode, direction, page, disabled=False):
+        label = "◀ Précédent" if direction == 'prev' else "Suivant ▶"
+        super().__init__(Button(
+            label=label, style=discord.ButtonStyle.secondary, disabled=disabled,
+            custom_id=f"bm:page:{mode}:{direction}:{page}", row=1
+        ))
+        self.mode = mode
+        self.direction = direction
+        self.page = page
+
+    @classmethod
+    async def from_custom_id(cls, interaction, item, match):
+        return cls(match['mode'], match['direction'], int(match['page']))
+
+    async def callback(self, interaction):
+        target = self.page - 1 if self.direction == 'prev' else self.page + 1
+        await send_browser(interaction.response.edit_message, target, self.mode)
+
+
+class HelpButton(DynamicItem[Button], template=r'bm:help:(?P<action>music|status)'):
+    """Buttons under the !aide message"""
+
+    def __init__(self, action):
+        if action == 'music':
+            button = Button(label="🎵 Voir Musiques", style=discord.ButtonStyle.primary, custom_id="bm:help:music")
+        else:
+            button = Button(label="ℹ️ Statut Bot", style=discord.ButtonStyle.secondary, custom_id="bm:help:status")
+        super().__init__(button)
+        self.action = action
+
+    @classmethod
+    async def from_custom_id(cls, interaction, item, match):
+        return cls(match['action'])
+
+    async def callback(self, interaction):
+        if self.action == 'status':
+            await _handlers['status'](interaction)
+            return
+        if not library.exists:
+            await interaction.response.send_message("❌ Dossier musique introuvable !", ephemeral=True)
+            return
+        if not len(library):
+            await interaction.response.send_message("📁 Aucun fichier audio trouvé", ephemeral=True)
+            return
+        await send_browser(interaction.response.send_message, 0, 'e', ephemeral=True)
+
+
+def help_view():
+    view = View(timeout=None)
+    view.add_item(HelpButton('music'))
+    view.add_item(HelpButton('status'))
+    return view
+
+
+def setup_dispatcher(bot, on_play, on_status):
+    """Register the dynamic items once, so every browser message routes here"""
+    _handlers['play'] = on_play
+    _handlers['status'] = on_status
+    bot.add_dynamic_items(TrackSelect, PageButton, HelpButton)
@@ -0,0 +1,86 @@
+"""
+Offline loudness and silence analysis
+Measures integrated loudness, true peak and leading/trailing silence once
+per track (in the background, through the ffmpeg budget) so playback can
+apply a static gain and start offset instead of running loudnorm live.
+"""
+
+import json
+import os
+import re
+
+from transcoder import transcoder
+
+NORMALIZE = os.getenv('NORMALIZE_LOUDNESS', '1') != '0'
+TARGET_LUFS = float(os.getenv('LOUDNESS_TARGET', '-16'))
+# Keep true peaks under this after gain is applied
+PEAK_CEILING = -1.0
+MAX_BOOST_DB = 10.0
+# Gains smaller than this are not worth a re-encode
+MIN_GAIN_DB = 0.5
+SILENCE_THRESHOLD = '-50dB'
+SILENCE_MIN_DURATION = 0.3
+# A silence ending this close to the end of the file runs to the end
+EOF_TOLERANCE = 0.05
+# Bumped when measurements change, so stored rows are analyzed again
+ANALYSIS_VERSION = 2
+
+_SILENCE_START = re.compile(r'silence_start: (-?[\d.]+)')
+_SILENCE_END = re.compile(r'silence_end: (-?[\d.]+)')
+_PROGRESS_TIME = re.compile(r'time=(\d+):(\d+):([\d.]+)')
+
+
+def analyze(file_path, duration=None):
+    """Run one ffmpeg pass and return loudness, peak and silence measurements"""
+    result = transcoder.run([
+        'ffmpeg', '-nostdin', '-hide_banner', '-i', file_path, '-vn',
+        '-af', f'silencedetect=n={SILENCE_THRESHOLD}:d={SILENCE_MIN_DURATION},loudnorm=print_format=json',
+        '-f', 'null', '-'
+    ])
+    stderr = result.stderr.decode('utf-8', errors='replace')
+
+    # loudnorm prints its JSON block last
+    stats = json.loads(stderr[stderr.rindex('{'):stderr.rindex('}') + 1])
+    loudness = float(stats['input_i'])
+    peak = float(stats['input_tp'])
+
+    # The decoded length is more exact than a duration read from headers
+    progress = _PROGRESS_TIME.findall(stderr)
+    if progress:
+        hours, minutes, seconds = progress[-1]
+        duration = int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+    starts = [float(x) for x in _SILENCE_START.findall(stderr)]
+    ends = [float(x) for x in _SILENCE_END.findall(stderr)]
+    # Older ffmpeg omits the silence_end of a silence that reaches EOF
+    silences = [(start, ends[i] if i < len(ends) else duration) for i, start in enumerate(starts)]
+
+    def reaches_end(end):
+        return end is None or (duration is not None and end >= duration - EOF_TOLERANCE)
+
+    lead = trail = 0.0
+    if silences and silences[0][0] <= 0.05 and not reaches_end(silences[0][1]):
+        lead = silences[0][1]
+    if silences and duration and reaches_end(silences[-1][1]) and silences[-1][0] > 0.05:
+        trail = max(0.0, duration - silences[-1][0])
+    # A file that is silent throughout keeps both at 0 and plays as is
+
+    return {
+        "loudness": loudness if loudness > -70 else None,
+        "peak": peak,
+        "lead_silence": lead,
+        "trail_silence": trail,
+    }
+
+
+def playback_params(row):
+    """(gain_db, start_offset) for a catalog row; (0, 0) when unknown"""
+    if not NORMALIZE or row is None or row.get('loudness') is None:
+        return 0.0, 0.0
+    gain = TARGET_LUFS - row['loudness']
+    if row.get('peak') is not None:
+        gain = min(gain, PEAK_CEILING - row['peak'])
+    gain = min(gain, MAX_BOOST_DB)
+    if abs(gain) < MIN_GAIN_DB:
+        gain = 0.0
+    return round(gain, 1), round(row.get('lead_silence') or 0.0, 2)
@@ -1,28 +1,41 @@
 import discord
 from discord.ext import commands
+from discord import app_commands
 import asyncio
 import os
-import subprocess
-from keep_alive import keep_alive
+import time
+from keep_alive import start_server
+from ffmpeg_capabilities import capabilities
+from voice_sessions import sessions
+from event_bus import events
+import player
+import metrics
+from library_browser import help_view, send_browser, setup_dispatcher
+from search_index import search_index
+from catalog import catalog, format_duration
+from crossfade import MAX_SECONDS as MAX_CROSSFADE
+from volume import MAX_VOLUME
+from transcoder import transcoder, TranscoderBusy
+from music_library import library, music_folder, is_audio_file, AUDIO_EXTENSIONS
 
 # Install FFmpeg on startup
 def install_ffmpeg():
     """Install FFmpeg if not already installed"""
-    try:
-        # Check if FFmpeg is already installed
-        subprocess.run(['ffmpeg', '-version'], capture_output=True, check=True)
+    # The capability registry only forks ffmpeg the first time a binary is seen
+    if capabilities.snapshot()["available"]:
         print("FFmpeg is already installed")
         return True
-    except (subprocess.CalledProcessError, FileNotFoundError):
-        print("FFmpeg not found, installing...")
-        try:
-            # Install FFmpeg using the installation script
-            import install_ffmpeg
-            install_ffmpeg.install()
-            return True
-        except Exception as e:
-            print(f"Failed to install FFmpeg: {e}")
-            return False
+    
+    print("FFmpeg not found, installing...")
+    try:
+        # Install FFmpeg using the installation script
+        import install_ffmpeg
+        install_ffmpeg.install()
+        capabilities.refresh(force=True)
+        return True
+    except Exception as e:
+        print(f"Failed to install FFmpeg: {e}")
+        return False
 
 # Install FFmpeg before starting the bot
 if not install_ffmpeg():
@@ -32,39 +45,86 @@ if not install_ffmpeg():
 intents = discord.Intents.default()
 intents.message_content = True
 intents.voice_states = True
-bot = commands.Bot(command_prefix='!', intents=intents)
 
-# Global variables for music playback
-current_voice_client = None
-music_folder = "./music"
+# Sharding: Discord picks the shard count unless SHARD_COUNT is set; a cluster
+# worker (see cluster.py) gets SHARD_IDS with the subset it should run
+shard_count = int(os.getenv('SHARD_COUNT')) if os.getenv('SHARD_COUNT') else None
+shard_ids = [int(i) for i in os.getenv('SHARD_IDS').split(',')] if os.getenv('SHARD_IDS') else None
+cluster_id = int(os.getenv('CLUSTER_ID', '0'))
+bot = commands.AutoShardedBot(
+    command_prefix='!', intents=intents, shard_count=shard_count, shard_ids=shard_ids
+)
+
+# Clicks on play buttons within this window collapse into the last one
+COALESCE_WINDOW = float(os.getenv('CLICK_COALESCE_SECONDS', '0.15'))
+
+# Port for the keep-alive dashboard, set by main()
+web_port = 5000
+
+async def setup_hook():
+    """Start the keep-alive server on the bot's own event loop"""
+    await start_server(bot, web_port)
+    
+    # One persistent handler for every library browser and help button
+    setup_dispatcher(bot, play_from_interaction, send_bot_status)
+    
+    # Register slash commands such as /play (once, not from every cluster)
+    if cluster_id != 0:
+        return
+    try:
+        synced = await bot.tree.sync()
+        print(f"Synced {len(synced)} slash commands")
+    except Exception as e:
+        print(f"Failed to sync slash commands: {e}")
+
+bot.setup_hook = setup_hook
+
+# Music playback state lives in per-guild sessions (see voice_sessions.py)
+# and the music folder is indexed once in music_library.py
+
+@bot.before_invoke
+async def start_command_timer(ctx):
+    ctx.started_at = time.perf_counter()
+
+@bot.after_invoke
+async def record_command_latency(ctx):
+    """Feed the per-command latency histogram on /metrics"""
+    started = getattr(ctx, 'started_at', None)
+    if started is not None:
+        metrics.command_latency.observe(time.perf_counter() - started, ctx.command.name)
 
 @bot.event
 async def on_ready():
     print(f'{bot.user} has connected to Discord!')
-    print(f'Bot is in {len(bot.guilds)} guilds')
+    print(f'Bot is in {len(bot.guilds)} guilds across shards {sorted(bot.shards)} (cluster {cluster_id})')
 
 @bot.command(name='join')
 async def join_voice_channel(ctx):
     """Join the voice channel that the user is currently in"""
-    global current_voice_client
-    
     if ctx.author.voice is None:
         await ctx.send("❌ Vous devez être dans un canal vocal!")
         return
     
     voice_channel = ctx.author.voice.channel
+    session = sessions.get(ctx.guild.id)
     
     try:
-        # If already connected to the same channel
-        if current_voice_client and current_voice_client.channel == voice_channel:
-            await ctx.send(f"✅ Déjà connecté à **{voice_channel.name}**!")
-            return
-        
-        # Disconnect from current channel if connected elsewhere
-        if current_voice_client is not None:
-            await current_voice_client.disconnect()
-        
-        current_voice_client = await voice_channel.connect(timeout=60.0, reconnect=True)
+        async with session.lock:
+            # If already connected to the same channel
+            if session.voice_client and session.channel == voice_channel:
+                await ctx.send(f"✅ Déjà connecté à **{voice_channel.name}**!")
+                return
+            
+            # Connected elsewhere in this guild: move the existing connection,
+            # keeping the voice session, its encryption keys and the player
+            if session.is_connected():
+                await session.voice_client.move_to(voice_channel)
+                await ctx.send(f"✅ Déplacé vers **{voice_channel.name}**")
+                return
+            
+            if session.voice_client is not None:
+                await session.disconnect()
+            session.voice_client = await voice_channel.connect(timeout=60.0, reconnect=True)
         await ctx.send(f"✅ Rejoint **{voice_channel.name}** - Prêt à jouer de la musique!")
         
     except Exception as e:
@@ -74,43 +134,51 @@ async def join_voice_channel(ctx):
 @bot.command(name='leave')
 async def leave_voice_channel(ctx):
     """Leave the current voice channel"""
-    global current_voice_client
+    session = sessions.peek(ctx.guild.id)
     
-    if current_voice_client is None:
+    if session is None or session.voice_client is None:
         await ctx.send("❌ Bot is not connected to any voice channel!")
         return
     
     try:
-        await current_voice_client.disconnect()
-        current_voice_client = None
+        async with session.lock:
+            await session.disconnect()
+        sessions.remove(ctx.guild.id)
         await ctx.send("✅ Left the voice channel")
         
     except Exception as e:
         await ctx.send(f"❌ Failed to leave voice channel: {str(e)}")
         print(f"Error leaving voice channel: {e}")
 
+def resolve_filename(filename):
+    """Match a user-supplied name to a library file, falling back to fuzzy search"""
+    filename = filename.strip()
+    if is_audio_file(filename) and library.get(filename) is not None:
+        return filename
+    for extension in AUDIO_EXTENSIONS:
+        if library.get(filename + extension) is not None:
+            return filename + extension
+    
+    # Partial names, typos, missing accents
+    match = search_index.resolve(filename)
+    if match is not None:
+        return match.name
+    return filename if is_audio_file(filename) else filename + '.mp3'
+
 @bot.command(name='play')
 async def play_music(ctx, *, filename):
-    """Play an MP3 file from the music folder"""
-    global current_voice_client
+    """Play an audio file from the music folder, or queue it if audio is playing"""
+    session = sessions.peek(ctx.guild.id)
     
-    if current_voice_client is None:
+    if session is None or session.voice_client is None:
         await ctx.send("❌ Bot is not connected to any voice channel! Use `!join` first.")
         return
     
-    if current_voice_client.is_playing():
-        await ctx.send("❌ Already playing audio! Use `!stop` to stop current playback.")
-        return
-    
-    # Clean filename and ensure it has .mp3 extension
-    filename = filename.strip()
-    if not filename.endswith('.mp3'):
-        filename += '.mp3'
-    
+    filename = resolve_filename(filename)
     file_path = os.path.join(music_folder, filename)
     
     # Check if file exists
-    if not os.path.exists(file_path):
+    if library.get(filename) is None:
         await ctx.send(f"❌ File `{filename}` not found in music folder!")
         return
     
@@ -120,25 +188,22 @@ async def play_music(ctx, *, filename):
             await ctx.send(f"❌ Cannot access file `{filename}` - permission denied")
             return
         
-        # Try FFmpegOpusAudio first (more stable on Linux), fallback to PCM
-        try:
-            audio_source = discord.FFmpegOpusAudio(file_path)
-            print(f"Using Opus audio source for {filename}")
-        except Exception as opus_error:
-            print(f"Opus failed, trying PCM: {opus_error}")
-            audio_source = discord.FFmpegPCMAudio(file_path)
-        
-        # Play the audio with detailed error reporting
-        def after_playing(error):
-            if error:
-                print(f'Playback finished with error: {error}')
+        async with session.lock:
+            session.text_channel = ctx.channel
+            if session.is_playing():
+                player.enqueue(session, filename)
+                position = len(session.queue)
             else:
-                print('Playback finished successfully')
-        
-        current_voice_client.play(audio_source, after=after_playing)
+                await player.play_track(session, filename)
+                position = 0
         
-        await ctx.send(f"🎵 Now playing: `{filename}`")
+        if position:
+            await ctx.send(f"➕ Added to queue (#{position}): `{filename}`")
+        else:
+            await ctx.send(f"🎵 Now playing: `{filename}`")
         
+    except TranscoderBusy as e:
+        await ctx.send(f"⏳ {e}")
     except Exception as e:
         await ctx.send(f"❌ Failed to play audio: {str(e)}")
         print(f"Error playing audio: {e}")
@@ -148,126 +213,334 @@ async def play_music(ctx, *, filename):
 
 @bot.command(name='stop')
 async def stop_music(ctx):
-    """Stop the currently playing audio"""
-    global current_voice_client
+    """Stop the currently playing audio and clear the queue"""
+    session = sessions.peek(ctx.guild.id)
     
-    if current_voice_client is None:
+    if session is None or session.voice_client is None:
         await ctx.send("❌ Bot is not connected to any voice channel!")
         return
     
-    if not current_voice_client.is_playing():
+    if not session.is_playing():
         await ctx.send("❌ No audio is currently playing!")
         return
     
     try:
-        current_voice_client.stop()
+        async with session.lock:
+            player.stop(session)
         await ctx.send("⏹️ Stopped audio playback")
         
     except Exception as e:
         await ctx.send(f"❌ Failed to stop audio: {str(e)}")
         print(f"Error stopping audio: {e}")
 
+@bot.command(name='queue')
+async def queue_music(ctx, *, filename=None):
+    """Add a track to the queue, or show the queue when no filename is given"""
+    session = sessions.peek(ctx.guild.id)
+    
+    if filename is None:
+        if session is None or (not session.current_track and not session.queue):
+            await ctx.send("📭 The queue is empty")
+            return
+        
+        lines = []
+        if session.current_track:
+            lines.append(f"▶️ `{session.current_track}`")
+        for i, queued in enumerate(list(session.queue)[:20], start=1):
+            lines.append(f"{i}. `{queued}`")
+        if len(session.queue) > 20:
+            lines.append(f"... and {len(session.queue) - 20} more")
+        await ctx.send("🎶 **Queue:**\n" + "\n".join(lines))
+        return
+    
+    # Queuing with nothing playing behaves like !play
+    await play_music(ctx, filename=filename)
+
+@bot.command(name='skip')
+async def skip_music(ctx):
+    """Skip the current track and play the next one in the queue"""
+    session = sessions.peek(ctx.guild.id)
+    
+    if session is None or not session.is_playing():
+        await ctx.send("❌ No audio is currently playing!")
+        return
+    
+    skipped = session.current_track
+    player.skip(session)
+    if session.queue:
+        await ctx.send(f"⏭️ Skipped `{skipped}` - next: `{session.queue[0]}`")
+    else:
+        await ctx.send(f"⏭️ Skipped `{skipped}` - queue is now empty")
+
+@bot.command(name='next')
+async def next_music(ctx, *, filename=None):
+    """Queue a track to play right after the current one, or skip when no filename is given"""
+    if filename is None:
+        await skip_music(ctx)
+        return
+    
+    session = sessions.peek(ctx.guild.id)
+    if session is None or not session.is_playing():
+        await play_music(ctx, filename=filename)
+        return
+    
+    filename = resolve_filename(filename)
+    if library.get(filename) is None:
+        await ctx.send(f"❌ File `{filename}` not found in music folder!")
+        return
+    
+    async with session.lock:
+        session.text_channel = ctx.channel
+        player.enqueue(session, filename, front=True)
+    await ctx.send(f"⏭️ Up next: `{filename}`")
+
+def parse_time(text):
+    """Parse "90", "1:30" or "1:02:03" into seconds, or None if malformed"""
+    try:
+        parts = [float(part) for part in text.strip().split(':')]
+    except ValueError:
+        return None
+    if not 1 <= len(parts) <= 3 or any(part < 0 for part in parts):
+        return None
+    seconds = 0.0
+    for part in parts:
+        seconds = seconds * 60 + part
+    return seconds
+
+@bot.command(name='sfx')
+async def sound_effect(ctx, *, filename):
+    """Layer a sound over the current track, or play it when nothing is playing"""
+    session = sessions.peek(ctx.guild.id)
+    
+    if session is None or not session.is_playing():
+        await play_music(ctx, filename=filename)
+        return
+    
+    filename = resolve_filename(filename)
+    if library.get(filename) is None:
+        await ctx.send(f"❌ File `{filename}` not found in music folder!")
+        return
+    
+    try:
+        if player.needs_transcoder(os.path.join(music_folder, filename)):
+            transcoder.check_admission()
+        source = await asyncio.to_thread(player.create_audio_source, os.path.join(music_folder, filename))
+        async with session.lock:
+            if not session.is_playing():
+                source.cleanup()
+                await ctx.send("❌ No audio is currently playing!")
+                return
+            added = player.overlay(session, source)
+        if added:
+            await ctx.send(f"🔊 Mixing `{filename}` over `{session.current_track}`")
+        else:
+            await ctx.send(f"⏳ Too many sounds at once (max {player.MAX_OVERLAYS})")
+    except TranscoderBusy as e:
+        await ctx.send(f"⏳ {e}")
+    except Exception as e:
+        await ctx.send(f"❌ Failed to mix audio: {str(e)}")
+        print(f"Error mixing {filename}: {e}")
+
+@bot.command(name='crossfade')
+async def set_crossfade(ctx, seconds: float = None):
+    """Show or set the overlap between queued tracks, in seconds (0 to disable)"""
+    session = sessions.get(ctx.guild.id)
+    
+    if seconds is None:
+        if session.crossfade:
+            await ctx.send(f"🔀 Crossfade: {session.crossfade:g} s")
+        else:
+            await ctx.send("🔀 Crossfade disabled")
+        return
+    
+    if not 0 <= seconds <= MAX_CROSSFADE:
+        await ctx.send(f"❌ Crossfade must be between 0 and {MAX_CROSSFADE:g} seconds")
+        return
+    
+    # Below one frame there is nothing to blend
+    session.crossfade = seconds if seconds >= 0.1 else 0.0
+    if session.crossfade:
+        await ctx.send(f"🔀 Crossfade set to {session.crossfade:g} s (from the next track)")
+    else:
+        await ctx.send("🔀 Crossfade disabled")
+
+@bot.command(name='volume')
+async def set_volume(ctx, percent: int = None):
+    """Show or set this server's playback volume (0-200%)"""
+    session = sessions.get(ctx.guild.id)
+    
+    if percent is None:
+        await ctx.send(f"🔊 Volume: {round(session.volume * 100)}%")
+        return
+    
+    if not 0 <= percent <= MAX_VOLUME * 100:
+        await ctx.send(f"❌ Volume must be between 0 and {int(MAX_VOLUME * 100)}%")
+        return
+    
+    # Applied on the next frame, ramped to avoid clicks
+    session.volume = percent / 100
+    await ctx.send(f"🔊 Volume set to {percent}%")
+
+@bot.command(name='seek')
+async def seek_music(ctx, position):
+    """Jump to a position in the current track (seconds or m:ss)"""
+    session = sessions.peek(ctx.guild.id)
+    
+    if session is None or not session.is_playing():
+        await ctx.send("❌ No audio is currently playing!")
+        return
+    
+    seconds = parse_time(position)
+    if seconds is None:
+        await ctx.send("❌ Invalid time! Usage: `!seek 1:30` or `!seek 90`")
+        return
+    
+    track = library.get(session.current_track)
+    row = catalog.get(track) if track else None
+    if row is not None and row['duration'] and seconds >= row['duration']:
+        await ctx.send(f"❌ `{session.current_track}` is only {format_duration(row['duration'])} long")
+        return
+    
+    try:
+        async with session.lock:
+            await player.seek(session, seconds)
+        await ctx.send(f"⏩ Seeked to {format_duration(seconds)} in `{session.current_track}`")
+    except TranscoderBusy as e:
+        await ctx.send(f"⏳ {e}")
+    except Exception as e:
+        await ctx.send(f"❌ Failed to seek: {str(e)}")
+        print(f"Error seeking: {e}")
+
+@bot.command(name='resume')
+async def resume_music(ctx):
+    """Resume the last stopped track where it left off"""
+    session = sessions.peek(ctx.guild.id)
+    
+    if session is None or session.voice_client is None:
+        await ctx.send("❌ Bot is not connected to any voice channel! Use `!join` first.")
+        return
+    
+    if session.resume_point is None:
+        await ctx.send("❌ Nothing to resume!")
+        return
+    
+    filename, seconds = session.resume_point
+    if library.get(filename) is None:
+        await ctx.send(f"❌ File `{filename}` not found in music folder!")
+        return
+    
+    try:
+        async with session.lock:
+            await player.play_track(session, filename, position=seconds)
+            session.resume_point = None
+        await ctx.send(f"▶️ Resumed `{filename}` at {format_duration(seconds)}")
+    except TranscoderBusy as e:
+        await ctx.send(f"⏳ {e}")
+    except Exception as e:
+        await ctx.send(f"❌ Failed to resume: {str(e)}")
+        print(f"Error resuming {filename}: {e}")
+
+async def drop_superseded(interaction):
+    """Clear the pending answer of a play request a newer click replaced"""
+    # For buttons and menus the deferred response is the message holding
+    # them, which must stay; only slash commands have a "thinking..." to remove
+    if interaction.type is not discord.InteractionType.application_command:
+        return
+    try:
+        await interaction.delete_original_response()
+    except discord.NotFound:
+        pass
+
+async def play_from_interaction(interaction, filename, ephemeral=False):
+    """Join the user's voice channel if needed and play a track right away"""
+    await interaction.response.defer(ephemeral=ephemeral)
+    deferred_at = time.perf_counter()
+    
+    # Check if user is in a voice channel
+    if not interaction.user.voice or not interaction.user.voice.channel:
+        await interaction.followup.send("❌ Vous devez être dans un canal vocal!")
+        return
+    
+    if library.get(filename) is None:
+        await interaction.followup.send(f"❌ Fichier `{filename}` introuvable !")
+        return
+    
+    user_channel = interaction.user.voice.channel
+    session = sessions.get(interaction.guild.id)
+    title = os.path.splitext(filename)[0]
+    
+    # Last click wins: wait out a burst, then only the newest request plays
+    ticket = session.claim_control()
+    await asyncio.sleep(COALESCE_WINDOW)
+    if session.superseded(ticket):
+        await drop_superseded(interaction)
+        return
+    
+    # Connect (or move) and start playback as one step under the guild lock
+    joined = False
+    try:
+        async with session.lock:
+            superseded = session.superseded(ticket)
+            if not superseded:
+                if not session.voice_client or session.channel != user_channel:
+                    joined = True
+                    if session.is_connected():
+                        # Same guild: move rather than redo the voice handshake
+                        await session.voice_client.move_to(user_channel)
+                    else:
+                        if session.voice_client:
+                            await session.disconnect()
+                        session.voice_client = await user_channel.connect()
+                # Play the selected file, replacing current audio (the queue is kept)
+                session.text_channel = interaction.channel
+                await player.play_track(session, filename)
+                metrics.interaction_play_latency.observe(time.perf_counter() - deferred_at)
+    except TranscoderBusy as e:
+        await interaction.followup.send(f"⏳ {e}")
+        return
+    except Exception as e:
+        if joined and not session.is_connected():
+            await interaction.followup.send(f"❌ Impossible de rejoindre le canal: {str(e)}")
+        else:
+            await interaction.followup.send(f"❌ Erreur lors de la lecture: {str(e)}")
+        print(f"Error playing {filename}: {e}")
+        return
+    
+    if superseded:
+        await drop_superseded(interaction)
+        return
+    if joined:
+        await interaction.followup.send(f"🎵 Rejoint **{user_channel.name}** et joue **{title}**")
+    else:
+        await interaction.followup.send(f"🎵 Lecture de **{title}**")
+
+@bot.tree.command(name='play', description="Jouer une musique de la bibliothèque")
+@app_commands.describe(titre="Titre de la musique (recherche approximative)")
+async def slash_play(interaction: discord.Interaction, titre: str):
+    """Slash version of !play that joins the caller's channel and plays right away"""
+    await play_from_interaction(interaction, resolve_filename(titre))
+
+@slash_play.autocomplete('titre')
+async def play_autocomplete(interaction: discord.Interaction, current: str):
+    """Rank library tracks against what the user has typed so far"""
+    return [
+        app_commands.Choice(name=track.title[:100], value=track.name[:100])
+        for track, score in search_index.search(current, limit=25)
+    ]
+
 @bot.command(name='list')
 async def list_music(ctx):
-    """List available MP3 files with interactive play buttons"""
+    """Browse the music library page by page and play from a select menu"""
     try:
-        if not os.path.exists(music_folder):
+        if not library.exists:
             await ctx.send("❌ Dossier music introuvable!")
             return
         
-        mp3_files = [f for f in os.listdir(music_folder) if f.endswith('.mp3')]
-        
-        if not mp3_files:
-            await ctx.send("📁 Aucun fichier MP3 trouvé dans le dossier music")
+        if not len(library):
+            await ctx.send("📁 Aucun fichier audio trouvé dans le dossier music")
             return
         
-        from discord.ui import View, Button
-        
-        class MusicListView(View):
-            def __init__(self):
-                super().__init__(timeout=300)  # 5 minutes timeout
-                
-                # Add buttons for each music file (max 25 buttons per view)
-                for i, filename in enumerate(sorted(mp3_files)[:25]):
-                    # Truncate filename for button label
-                    display_name = filename[:-4] if filename.endswith('.mp3') else filename
-                    if len(display_name) > 80:
-                        display_name = display_name[:77] + "..."
-                    
-                    button = Button(
-                        label=display_name,
-                        style=discord.ButtonStyle.green,
-                        emoji="🎵",
-                        custom_id=f"play_{i}"
-                    )
-                    button.callback = self.create_play_callback(filename)
-                    self.add_item(button)
-            
-            def create_play_callback(self, filename):
-                async def play_callback(interaction):
-                    global current_voice_client
-                    await interaction.response.defer()
-                    
-                    # Check if user is in a voice channel
-                    if not interaction.user.voice or not interaction.user.voice.channel:
-                        await interaction.followup.send("❌ Vous devez être dans un canal vocal!")
-                        return
-                    
-                    user_channel = interaction.user.voice.channel
-                    
-                    # Auto-join if not connected or in different channel
-                    if not current_voice_client or current_voice_client.channel != user_channel:
-                        try:
-                            if current_voice_client:
-                                await current_voice_client.disconnect()
-                            current_voice_client = await user_channel.connect()
-                            await interaction.followup.send(f"🎵 Rejoint **{user_channel.name}** et joue **{filename[:-4]}**")
-                        except Exception as e:
-                            await interaction.followup.send(f"❌ Impossible de rejoindre le canal: {str(e)}")
-                            return
-                    else:
-                        await interaction.followup.send(f"🎵 Lecture de **{filename[:-4]}**")
-                    
-                    # Stop current audio if playing
-                    if current_voice_client.is_playing():
-                        current_voice_client.stop()
-                    
-                    # Play the selected file
-                    try:
-                        file_path = os.path.join(music_folder, filename)
-                        audio_source = discord.FFmpegOpusAudio(file_path)
-                        current_voice_client.play(audio_source)
-                        print(f"Using Opus audio source for {filename}")
-                    except Exception as e:
-                        await interaction.followup.send(f"❌ Erreur lors de la lecture: {str(e)}")
-                        print(f"Error playing {filename}: {e}")
-                
-                return play_callback
-        
-        # Create embed showing the music library
-        embed = discord.Embed(
-            title="🎵 Bibliothèque Musicale",
-            description=f"**{len(mp3_files)} fichiers disponibles**\n\nCliquez sur un bouton pour jouer instantanément:",
-            color=0x7289da
-        )
-        
-        embed.add_field(
-            name="🤖 Fonctionnement Automatique",
-            value="• Le bot rejoindra automatiquement votre canal vocal\n• Aucune commande à taper, juste cliquer!",
-            inline=False
-        )
-        
-        if len(mp3_files) > 25:
-            embed.add_field(
-                name="⚠️ Note",
-                value=f"Seuls les 25 premiers fichiers sont affichés. Total: {len(mp3_files)} fichiers.",
-                inline=False
-            )
-        
-        embed.set_footer(text="💡 Vous devez être dans un canal vocal pour que ça marche")
-        
-        view = MusicListView()
-        await ctx.send(embed=embed, view=view)
+        await send_browser(ctx.send)
         
     except Exception as e:
         await ctx.send(f"❌ Erreur lors du listage: {str(e)}")
@@ -276,8 +549,6 @@ async def list_music(ctx):
 @bot.command(name='aide')
 async def help_command(ctx):
     """Show help with interactive buttons"""
-    from discord.ui import View, Button
-    
     help_embed = discord.Embed(
         title="🎵 Bot Musical Discord",
         description="Voici toutes les commandes disponibles :",
@@ -287,8 +558,16 @@ async def help_command(ctx):
     help_embed.add_field(
         name="📻 Commandes Audio",
         value="`!join` - Rejoindre votre canal vocal\n"
-              "`!play <fichier>` - Jouer un fichier MP3\n"
-              "`!stop` - Arrêter la lecture\n"
+              "`!play <titre>` ou `/play` - Jouer un fichier audio (recherche approximative)\n"
+              "`!queue [fichier]` - Ajouter à la file / voir la file\n"
+              "`!skip` - Passer au morceau suivant\n"
+              "`!next <fichier>` - Jouer juste après le morceau en cours\n"
+              "`!seek <temps>` - Aller à une position (ex. `1:30`)\n"
+              "`!sfx <fichier>` - Superposer un son au morceau en cours\n"
+              "`!crossfade [secondes]` - Fondu enchaîné entre les morceaux (0 = désactivé)\n"
+              "`!volume [0-200]` - Voir ou régler le volume du serveur\n"
+              "`!stop` - Arrêter la lecture et vider la file\n"
+              "`!resume` - Reprendre là où la lecture s'est arrêtée\n"
               "`!leave` - Quitter le canal vocal",
         inline=False
     )
@@ -301,164 +580,67 @@ async def help_command(ctx):
         inline=False
     )
     
-    # Create view with music selection buttons
-    class MusicView(View):
-        def __init__(self):
-            super().__init__(timeout=300)  # 5 minutes timeout
-            
-        @discord.ui.button(label="🎵 Voir Musiques", style=discord.ButtonStyle.primary)
-        async def show_music(self, interaction: discord.Interaction, button: Button):
-            await self.show_music_list(interaction)
-            
-        @discord.ui.button(label="ℹ️ Statut Bot", style=discord.ButtonStyle.secondary)
-        async def show_status(self, interaction: discord.Interaction, button: Button):
-            await self.show_bot_status(interaction)
-            
-        async def show_music_list(self, interaction):
-            try:
-                if not os.path.exists(music_folder):
-                    await interaction.response.send_message("❌ Dossier musique introuvable !", ephemeral=True)
-                    return
-                
-                mp3_files = [f for f in os.listdir(music_folder) if f.endswith('.mp3')]
-                
-                if not mp3_files:
-                    await interaction.response.send_message("📁 Aucun fichier MP3 trouvé", ephemeral=True)
-                    return
-                
-                # Create music selection view
-                music_view = MusicSelectionView(mp3_files)
-                
-                embed = discord.Embed(
-                    title="🎵 Musiques Disponibles",
-                    description="Cliquez sur un bouton pour jouer une musique :",
-                    color=0x43b581
-                )
-                
-                file_list = "\n".join(f"• {file}" for file in sorted(mp3_files))
-                embed.add_field(name="Fichiers", value=file_list, inline=False)
-                
-                await interaction.response.send_message(embed=embed, view=music_view, ephemeral=True)
-                
-            except Exception as e:
-                await interaction.response.send_message(f"❌ Erreur : {str(e)}", ephemeral=True)
-                
-        async def show_bot_status(self, interaction):
-            global current_voice_client
-            
-            embed = discord.Embed(title="🤖 Statut du Bot", color=0x7289da)
-            
-            if current_voice_client is None:
-                embed.add_field(name="🔊 Vocal", value="Non connecté", inline=True)
-            else:
-                embed.add_field(name="🔊 Vocal", value=f"Connecté à {current_voice_client.channel.name}", inline=True)
-                if current_voice_client.is_playing():
-                    embed.add_field(name="🎵 Audio", value="En lecture", inline=True)
-                else:
-                    embed.add_field(name="🎵 Audio", value="Arrêté", inline=True)
-            
-            try:
-                mp3_count = len([f for f in os.listdir(music_folder) if f.endswith('.mp3')])
-                embed.add_field(name="📁 Musiques", value=f"{mp3_count} fichiers MP3", inline=True)
-            except:
-                embed.add_field(name="📁 Musiques", value="Impossible de vérifier", inline=True)
-            
-            await interaction.response.send_message(embed=embed, ephemeral=True)
-    
-    class MusicSelectionView(View):
-        def __init__(self, mp3_files):
-            super().__init__(timeout=300)
-            self.mp3_files = mp3_files
-            
-            # Add buttons for each MP3 file (max 25 buttons per view)
-            for i, file in enumerate(mp3_files[:25]):  # Discord limit
-                filename_without_ext = file.replace('.mp3', '')
-                # Truncate long filenames for button labels
-                label = filename_without_ext[:80] if len(filename_without_ext) > 80 else filename_without_ext
-                button = Button(
-                    label=label,
-                    style=discord.ButtonStyle.success,
-                    custom_id=f"play_{i}"
-                )
-                button.callback = self.create_play_callback(file)
-                self.add_item(button)
-        
-        def create_play_callback(self, filename):
-            async def play_callback(interaction):
-                global current_voice_client
-                await interaction.response.defer(ephemeral=True)
-                
-                # Check if user is in a voice channel
-                if not interaction.user.voice or not interaction.user.voice.channel:
-                    await interaction.followup.send("❌ Vous devez être dans un canal vocal!")
-                    return
-                
-                user_channel = interaction.user.voice.channel
-                
-                # Auto-join if not connected or in different channel
-                if not current_voice_client or current_voice_client.channel != user_channel:
-                    try:
-                        if current_voice_client:
-                            await current_voice_client.disconnect()
-                        current_voice_client = await user_channel.connect()
-                        await interaction.followup.send(f"🎵 Rejoint **{user_channel.name}** et joue **{filename[:-4]}**")
-                    except Exception as e:
-                        await interaction.followup.send(f"❌ Impossible de rejoindre le canal: {str(e)}")
-                        return
-                else:
-                    await interaction.followup.send(f"🎵 Lecture de **{filename[:-4]}**")
-                
-                # Stop current audio if playing
-                if current_voice_client.is_playing():
-                    current_voice_client.stop()
-                
-                file_path = os.path.join(music_folder, filename)
-                
-                if not os.path.exists(file_path):
-                    await interaction.followup.send(f"❌ Fichier `{filename}` introuvable !")
-                    return
-                
-                try:
-                    audio_source = discord.FFmpegOpusAudio(file_path)
-                    
-                    def after_playing(error):
-                        if error:
-                            print(f'Playback finished with error: {error}')
-                        else:
-                            print('Playback finished successfully')
-                    
-                    current_voice_client.play(audio_source, after=after_playing)
-                    print(f"Using Opus audio source for {filename}")
-                    
-                except Exception as e:
-                    await interaction.followup.send(f"❌ Erreur de lecture : {str(e)}")
-                    print(f"Error playing {filename}: {e}")
-                    
-            return play_callback
-    
-    view = MusicView()
+    # Buttons are dispatched by the dynamic items registered in setup_hook
+    view = help_view()
     await ctx.send(embed=help_embed, view=view)
+    view.stop()
+
+async def send_bot_status(interaction):
+    """Ephemeral status card for the !aide status button"""
+    session = sessions.peek(interaction.guild.id)
+    
+    embed = discord.Embed(title="🤖 Statut du Bot", color=0x7289da)
+    
+    if session is None or session.voice_client is None:
+        embed.add_field(name="🔊 Vocal", value="Non connecté", inline=True)
+    else:
+        embed.add_field(name="🔊 Vocal", value=f"Connecté à {session.channel.name}", inline=True)
+        if session.is_playing():
+            embed.add_field(name="🎵 Audio", value="En lecture", inline=True)
+        else:
+            embed.add_field(name="🎵 Audio", value="Arrêté", inline=True)
+    
+    try:
+        mp3_count = len(library)
+        embed.add_field(name="📁 Musiques", value=f"{mp3_count} fichiers audio", inline=True)
+    except:
+        embed.add_field(name="📁 Musiques", value="Impossible de vérifier", inline=True)
+    
+    await interaction.response.send_message(embed=embed, ephemeral=True)
 
 @bot.command(name='status')
 async def bot_status(ctx):
     """Show bot status and connection info"""
-    global current_voice_client
+    session = sessions.peek(ctx.guild.id)
     
     status_msg = "🤖 **Bot Status:**\n"
     
-    if current_voice_client is None:
+    if session is None or session.voice_client is None:
         status_msg += "• Voice: Not connected\n"
     else:
-        status_msg += f"• Voice: Connected to {current_voice_client.channel.name}\n"
-        if current_voice_client.is_playing():
-            status_msg += "• Audio: Playing\n"
+        status_msg += f"• Voice: Connected to {session.channel.name}\n"
+        if session.is_playing():
+            status_msg += f"• Audio: Playing `{session.current_track}`\n"
         else:
             status_msg += "• Audio: Stopped\n"
+        position = session.position()
+        if session.is_playing() and position is not None:
+            status_msg += f"• Position: {format_duration(position)}\n"
+        status_msg += f"• Queue: {len(session.queue)} track(s)\n"
+        send = session.send_stats.summary()
+        if send["frames"]:
+            status_msg += (
+                f"• Send: late p50 {send['late_p50_ms']} ms / p99 {send['late_p99_ms']} ms, "
+                f"read p99 {send['read_p99_ms']} ms, {send['stalls']} stall(s), {send['underruns']} underrun(s)\n"
+            )
+    
+    stats = transcoder.stats()
+    status_msg += f"• Transcoders: {stats['active']}/{stats['max_active']} active, {stats['waiting']} waiting\n"
     
     # Check music folder
     try:
-        mp3_count = len([f for f in os.listdir(music_folder) if f.endswith('.mp3')])
-        status_msg += f"• Music files: {mp3_count} MP3s available\n"
+        mp3_count = len(library)
+        status_msg += f"• Music files: {mp3_count} audio files available\n"
     except:
         status_msg += "• Music files: Unable to check\n"
     
@@ -468,10 +650,12 @@ async def bot_status(ctx):
 async def on_command_error(ctx, error):
     """Handle command errors"""
     if isinstance(error, commands.CommandNotFound):
-        await ctx.send("❌ Command not found! Available commands: `!join`, `!play`, `!stop`, `!leave`, `!list`, `!status`")
+        await ctx.send("❌ Command not found! Available commands: `!join`, `!play`, `!queue`, `!skip`, `!next`, `!seek`, `!sfx`, `!crossfade`, `!volume`, `!stop`, `!resume`, `!leave`, `!list`, `!status`")
     elif isinstance(error, commands.MissingRequiredArgument):
         if ctx.command.name == 'play':
             await ctx.send("❌ Please specify a filename! Usage: `!play <filename>`")
+        elif ctx.command.name == 'seek':
+            await ctx.send("❌ Please specify a time! Usage: `!seek 1:30`")
         else:
             await ctx.send(f"❌ Missing required argument for `!{ctx.command.name}`")
     else:
@@ -481,32 +665,60 @@ async def on_command_error(ctx, error):
 @bot.event
 async def on_voice_state_update(member, before, after):
     """Handle voice state updates - disconnect if alone in channel"""
-    global current_voice_client
+    if member.id == bot.user.id and before.channel != after.channel:
+        events.publish('voice', {
+            "guild_id": str(member.guild.id),
+            "channel": after.channel.name if after.channel else None
+        })
+    
+    session = sessions.peek(member.guild.id)
     
-    if current_voice_client is None:
+    if session is None or session.voice_client is None:
+        return
+    
+    # Drop the session if the bot itself was disconnected from voice
+    if member.id == bot.user.id and after.channel is None:
+        sessions.remove(member.guild.id)
+        print(f"Voice session closed for guild {member.guild.id}")
         return
     
     # Don't auto-disconnect for now to avoid connection issues
     # Check if bot is alone in voice channel
-    # if len(current_voice_client.channel.members) == 1:  # Only the bot
+    # if len(session.channel.members) == 1:  # Only the bot
     #     await asyncio.sleep(300)  # Wait 5 minutes
-    #     if current_voice_client and len(current_voice_client.channel.members) == 1:
+    #     if session.voice_client and len(session.channel.members) == 1:
     #         print("Bot alone in channel for 5 minutes, disconnecting...")
-    #         await current_voice_client.disconnect()
-    #         current_voice_client = None
+    #         await session.disconnect()
 
-def main():
+def main(port=5000):
+    global web_port
+    web_port = port
+    
     # Create music folder if it doesn't exist
     if not os.path.exists(music_folder):
         os.makedirs(music_folder)
         print(f"Created music folder: {music_folder}")
     
+    # Keep the ffmpeg snapshot fresh for health endpoints
+    capabilities.start_background_refresh()
+    
+    # Build the library index once before serving any command
+    library.refresh(force=True)
+    print(f"Indexed {len(library)} music files")
+    
+    # Build the search index now rather than on the first autocomplete
+    search_index.search('')
+    
+    # Load stored metadata and parse new or changed files in the background
+    catalog.start()
+    
+    # Short tracks already known to the catalog become memory-mapped clips
+    player.warm_soundboard()
+    
     # Install FFmpeg if needed (only when running directly, not from render_main)
     import sys
     if 'render_main' not in sys.modules:
         install_ffmpeg()
-        # Start keep-alive server in background
-        keep_alive()
     
     # Get Discord bot token from environment
     token = os.getenv('DISCORD_TOKEN')
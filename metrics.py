@@ -0,0 +1,191 @@
+"""
+Prometheus metrics
+Minimal counters, gauges and histograms rendered in the Prometheus text
+exposition format for the /metrics route. Hot-path observations only take
+a short lock; gauges are read from callbacks at scrape time.
+"""
+
+import asyncio
+import bisect
+import threading
+import time
+
+# Latency buckets in seconds, from one event-loop tick to a slow voice handshake
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (
+        (name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in pairs
+    )
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic counter, optionally split by labels"""
+
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, *labels):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        if not values and not self.labelnames:
+            values[()] = 0
+        for labels, value in sorted(values.items()):
+            yield self.name, _format_labels(self.labelnames, labels), value
+
+
+class Gauge:
+    """Value read from a callback when metrics are scraped"""
+
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, callback):
+        self.name = name
+        self.documentation = documentation
+        self.callback = callback
+
+    def samples(self):
+        try:
+            value = self.callback()
+        except Exception as e:
+            print(f"Gauge {self.name} failed: {e}")
+            return
+        if value is not None:
+            yield self.name, '', value
+
+
+class Histogram:
+    """Cumulative-bucket histogram, optionally split by labels"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # labels -> [bucket counts..., count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += 1
+            series[-1] += value
+
+    def time(self, *labels):
+        """Context manager observing the duration of its block"""
+        return _Timer(self, labels)
+
+    def samples(self):
+        with self._lock:
+            series = {labels: list(values) for labels, values in self._series.items()}
+        for labels, values in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, values):
+                cumulative += count
+                extra = (('le', _format_value(bound)),)
+                yield f"{self.name}_bucket", _format_labels(self.labelnames, labels, extra), cumulative
+            extra = (('le', '+Inf'),)
+            yield f"{self.name}_bucket", _format_labels(self.labelnames, labels, extra), values[-2]
+            yield f"{self.name}_count", _format_labels(self.labelnames, labels), values[-2]
+            yield f"{self.name}_sum", _format_labels(self.labelnames, labels), values[-1]
+
+
+class _Timer:
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started, *self.labels)
+        return False
+
+
+class Registry:
+    """Ordered set of metrics rendered together"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics[metric.name] = metric
+        return metric
+
+    def render(self):
+        """Text exposition format (version 0.0.4)"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{labels} {_format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+command_latency = registry.register(Histogram(
+    'botmusique_command_duration_seconds', "Time to handle a chat command", ('command',)
+))
+interaction_play_latency = registry.register(Histogram(
+    'botmusique_interaction_defer_to_play_seconds', "Time from interaction defer to play() returning"
+))
+ffmpeg_spawn = registry.register(Histogram(
+    'botmusique_ffmpeg_spawn_seconds', "Time to start an ffmpeg audio source"
+))
+playback_errors = registry.register(Counter(
+    'botmusique_playback_errors_total', "Tracks that ended with an error in the after callback"
+))
+
+# Updated by monitor_loop_lag()
+loop_lag = 0.0
+
+
+async def monitor_loop_lag(interval=0.5):
+    """Measure how late the event loop wakes up from a fixed sleep"""
+    global loop_lag
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(interval)
+        loop_lag = max(0.0, loop.time() - started - interval)
+
+
+registry.register(Gauge(
+    'botmusique_event_loop_lag_seconds', "Event-loop wake-up delay over the last interval",
+    lambda: loop_lag
+))
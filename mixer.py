@@ -0,0 +1,158 @@
+"""
+In-process PCM mixer
+Layers sound effects over the playing track: every stream is decoded to
+20 ms blocks of 48 kHz stereo PCM, scaled, summed with NumPy and limited
+against clipping, then encoded back to Opus. With no overlay active the
+main track's Opus packets pass through untouched.
+"""
+
+import threading
+
+import discord
+import numpy as np
+
+SAMPLES_PER_FRAME = 960  # per channel, 20 ms at 48 kHz
+CHANNELS = 2
+FRAME_VALUES = SAMPLES_PER_FRAME * CHANNELS
+PCM_LIMIT = 32767.0
+# How fast the limiter lets the gain recover after a peak, per frame
+LIMITER_RELEASE = 0.05
+
+
+class PCMStream:
+    """Audio source read as 20 ms int16 blocks, decoding Opus when needed"""
+
+    def __init__(self, source, gain=1.0):
+        self.source = source
+        self.gain = gain
+        self._decoder = discord.opus.Decoder() if source.is_opus() else None
+
+    def read_pcm(self):
+        """Next block as an int16 array, or None at the end of the stream"""
+        data = self.source.read()
+        if not data:
+            return None
+        if self._decoder is not None:
+            data = self._decoder.decode(data, fec=False)
+        block = np.frombuffer(data, dtype=np.int16)
+        if len(block) < FRAME_VALUES:
+            # Short last frame from a PCM source
+            block = np.pad(block, (0, FRAME_VALUES - len(block)))
+        return block
+
+    def cleanup(self):
+        self.source.cleanup()
+
+
+class Limiter:
+    """Per-block peak limiter: instant attack, gradual release"""
+
+    def __init__(self, release=LIMITER_RELEASE):
+        self.release = release
+        self.gain = 1.0
+
+    def apply(self, mixed):
+        peak = float(np.abs(mixed).max()) if len(mixed) else 0.0
+        target = min(1.0, PCM_LIMIT / peak) if peak else 1.0
+        if target < self.gain:
+            self.gain = target
+        else:
+            self.gain += (target - self.gain) * self.release
+        if self.gain < 1.0:
+            mixed *= self.gain
+        return mixed
+
+
+def mix_blocks(blocks, gains, limiter, out=None):
+    """Sum int16 blocks with per-stream gain into limited int16 PCM"""
+    acc = out if out is not None else np.empty(FRAME_VALUES, dtype=np.float32)
+    acc.fill(0.0)
+    for block, gain in zip(blocks, gains):
+        if gain == 1.0:
+            acc += block
+        else:
+            acc += block * np.float32(gain)
+    limiter.apply(acc)
+    # Belt and braces: the limiter's release can still let a transient through
+    np.clip(acc, -PCM_LIMIT - 1, PCM_LIMIT, out=acc)
+    return acc.astype(np.int16)
+
+
+class MixerSource(discord.AudioSource):
+    """Opus source mixing overlay streams on top of a main track"""
+
+    def __init__(self, main):
+        self.main = main
+        self._main_stream = None
+        self._overlays = []
+        self._lock = threading.Lock()
+        self._limiter = Limiter()
+        self._encoder = None
+        self._acc = np.empty(FRAME_VALUES, dtype=np.float32)
+
+    def add(self, source, gain=1.0):
+        """Layer a source over the main track until it ends"""
+        stream = PCMStream(source, gain)
+        with self._lock:
+            self._overlays.append(stream)
+        return stream
+
+    @property
+    def overlays(self):
+        with self._lock:
+            return len(self._overlays)
+
+    def read(self):
+        with self._lock:
+            overlays = list(self._overlays)
+
+        # Nothing layered: pass Opus through without decoding. The decoder
+        # then resumes on a later packet, which Opus recovers from in a frame
+        if not overlays and self.main is not None and self.main.is_opus():
+            return self.main.read()
+
+        blocks, gains = [], []
+        if self.main is not None:
+            if self._main_stream is None:
+                self._main_stream = PCMStream(self.main)
+            block = self._main_stream.read_pcm()
+            if block is None:
+                # Main track over: let the overlays finish, then end
+                self.main.cleanup()
+                self.main = None
+            else:
+                blocks.append(block)
+                gains.append(self._main_stream.gain)
+
+        finished = []
+        for stream in overlays:
+            block = stream.read_pcm()
+            if block is None:
+                finished.append(stream)
+            else:
+                blocks.append(block)
+                gains.append(stream.gain)
+        if finished:
+            with self._lock:
+                self._overlays = [s for s in self._overlays if s not in finished]
+            for stream in finished:
+                stream.cleanup()
+
+        if not blocks:
+            return b''
+        pcm = mix_blocks(blocks, gains, self._limiter, self._acc)
+        if self._encoder is None:
+            self._encoder = discord.opus.Encoder()
+        return self._encoder.encode(pcm.tobytes(), SAMPLES_PER_FRAME)
+
+    def is_opus(self):
+        return True
+
+    def cleanup(self):
+        if self.main is not None:
+            self.main.cleanup()
+            self.main = None
+        with self._lock:
+            overlays, self._overlays = self._overlays, []
+        for stream in overlays:
+            stream.cleanup()
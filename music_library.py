@@ -0,0 +1,143 @@
+"""
+Shared in-memory index of the music folder
+Built once at startup and refreshed incrementally when the folder's mtime
+changes (a single rate-limited stat), so commands and dashboard endpoints
+never re-scan the disk per request.
+"""
+
+import hashlib
+import os
+import threading
+import time
+
+music_folder = "./music"
+AUDIO_EXTENSIONS = ('.mp3', '.opus', '.ogg')
+
+# Minimum delay between two directory mtime checks
+REFRESH_INTERVAL = 2.0
+
+
+def is_audio_file(filename):
+    return filename.lower().endswith(AUDIO_EXTENSIONS)
+
+
+def track_id(name):
+    """Short stable ID for a filename, small enough for component custom IDs"""
+    return hashlib.sha1(name.encode('utf-8')).hexdigest()[:12]
+
+
+class Track:
+    """A single audio file in the library"""
+
+    __slots__ = ('name', 'path', 'size', 'mtime', 'id')
+
+    def __init__(self, name, path, size, mtime):
+        self.id = track_id(name)
+        self.name = name
+        self.path = path
+        self.size = size
+        self.mtime = mtime
+
+    @property
+    def title(self):
+        """Filename without its extension, for display"""
+        return os.path.splitext(self.name)[0]
+
+
+class MusicLibrary:
+    """Index of the audio files in a folder"""
+
+    def __init__(self, folder=music_folder):
+        self.folder = folder
+        self.version = 0
+        self._tracks = {}
+        self._by_id = {}
+        self._sorted = ()
+        self._dir_mtime = None
+        self._last_check = 0.0
+        self._lock = threading.Lock()
+        self._listeners = []
+
+    def add_listener(self, callback):
+        """Register callback(library, added, removed) fired after each change"""
+        self._listeners.append(callback)
+
+    def refresh(self, force=False):
+        """Re-index the folder if its mtime changed since the last check"""
+        now = time.monotonic()
+        if not force and now - self._last_check < REFRESH_INTERVAL:
+            return False
+        with self._lock:
+            self._last_check = now
+            try:
+                dir_mtime = os.stat(self.folder).st_mtime_ns
+            except OSError:
+                dir_mtime = None
+            if not force and dir_mtime == self._dir_mtime:
+                return False
+            self._dir_mtime = dir_mtime
+            added, removed = self._rescan(dir_mtime is not None)
+        if added or removed:
+            for callback in self._listeners:
+                try:
+                    callback(self, added, removed)
+                except Exception as e:
+                    print(f"Library listener failed: {e}")
+        return bool(added or removed)
+
+    def _rescan(self, folder_exists):
+        """Diff the folder against the index, keeping unchanged entries"""
+        tracks = {}
+        added = []
+        if folder_exists:
+            with os.scandir(self.folder) as it:
+                for entry in it:
+                    if not is_audio_file(entry.name) or not entry.is_file():
+                        continue
+                    try:
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+                    track = self._tracks.get(entry.name)
+                    if track is None or track.size != stat.st_size or track.mtime != stat.st_mtime:
+                        track = Track(entry.name, entry.path, stat.st_size, stat.st_mtime)
+                        added.append(track)
+                    tracks[entry.name] = track
+        removed = [t for name, t in self._tracks.items() if tracks.get(name) is not t]
+
+        if added or removed:
+            self._tracks = tracks
+            self._by_id = {t.id: t for t in tracks.values()}
+            self._sorted = tuple(sorted(tracks.values(), key=lambda t: t.name.lower()))
+            self.version += 1
+        return added, removed
+
+    @property
+    def exists(self):
+        self.refresh()
+        return self._dir_mtime is not None
+
+    def tracks(self):
+        """All tracks sorted by name"""
+        self.refresh()
+        return self._sorted
+
+    def names(self):
+        return [t.name for t in self.tracks()]
+
+    def get(self, name):
+        self.refresh()
+        return self._tracks.get(name)
+
+    def by_id(self, track_id):
+        """Track for an ID from track_id(), or None"""
+        self.refresh()
+        return self._by_id.get(track_id)
+
+    def __len__(self):
+        self.refresh()
+        return len(self._sorted)
+
+
+# Shared library used by the bot and the dashboard
+library = MusicLibrary()
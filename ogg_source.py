@@ -0,0 +1,110 @@
+"""
+In-process Ogg/Opus playback
+Reads Ogg pages straight from disk and hands the Opus packets to the voice
+client, so tracks already stored as Opus need no ffmpeg subprocess.
+"""
+
+import os
+import threading
+
+import discord
+from discord.oggparse import OggStream
+
+# Discord sends one packet every 20 ms, so packets must carry exactly that
+FRAME_DURATION_MS = 20
+
+_SILK_HYBRID_MS = (10, 20, 40, 60)
+_CELT_MS = (2.5, 5, 10, 20)
+
+
+def packet_duration_ms(packet):
+    """Duration of an Opus packet from its TOC byte (RFC 6716, 3.1)"""
+    toc = packet[0]
+    config = toc >> 3
+    if config < 12:
+        frame_ms = _SILK_HYBRID_MS[config % 4]
+    elif config < 16:
+        frame_ms = _SILK_HYBRID_MS[config % 2]
+    else:
+        frame_ms = _CELT_MS[config % 4]
+
+    code = toc & 0x03
+    if code == 0:
+        frames = 1
+    elif code in (1, 2):
+        frames = 2
+    else:
+        frames = packet[1] & 0x3F if len(packet) > 1 else 0
+    return frame_ms * frames
+
+
+def iter_audio_packets(stream):
+    """Yield Opus audio packets, skipping the OpusHead/OpusTags headers"""
+    for packet in OggStream(stream).iter_packets():
+        if packet.startswith((b'OpusHead', b'OpusTags')):
+            continue
+        if packet:
+            yield packet
+
+
+_probe_cache = {}
+_probe_lock = threading.Lock()
+
+
+def is_native_opus(file_path):
+    """True if a file is Ogg/Opus with 20 ms packets and can skip ffmpeg"""
+    if not file_path.lower().endswith(('.opus', '.ogg')):
+        return False
+    try:
+        mtime = os.stat(file_path).st_mtime_ns
+    except OSError:
+        return False
+    with _probe_lock:
+        cached = _probe_cache.get(file_path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+
+    native = False
+    try:
+        with open(file_path, 'rb') as f:
+            packets = OggStream(f).iter_packets()
+            if next(packets, b'').startswith(b'OpusHead'):
+                for packet in packets:
+                    if packet and not packet.startswith(b'OpusTags'):
+                        native = packet_duration_ms(packet) == FRAME_DURATION_MS
+                        break
+    except Exception as e:
+        print(f"Ogg probe failed for {file_path}: {e}")
+
+    with _probe_lock:
+        _probe_cache[file_path] = (mtime, native)
+    return native
+
+
+class NativeOpusSource(discord.AudioSource):
+    """Audio source yielding Opus packets read directly from an Ogg file"""
+
+    def __init__(self, file_path, start=0.0, offset=0):
+        self.file_path = file_path
+        self._file = open(file_path, 'rb')
+        # Byte offset of an Ogg page from the seek index; start is then relative to it
+        if offset:
+            self._file.seek(offset)
+        self._packets = iter_audio_packets(self._file)
+        # Start offset: drop whole 20 ms packets, no decoding needed
+        for _ in range(int(start * 1000 // FRAME_DURATION_MS)):
+            if next(self._packets, None) is None:
+                break
+
+    def read(self):
+        if self._file is None:
+            return b''
+        return next(self._packets, b'')
+
+    def is_opus(self):
+        return True
+
+    def cleanup(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
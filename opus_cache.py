@@ -0,0 +1,158 @@
+"""
+Pre-encoded Ogg/Opus cache
+Tracks are transcoded to Ogg/Opus once, in the background, so that later
+plays read the packets in-process instead of re-encoding.
+Entries are keyed by source path, size and mtime and evicted LRU-first once
+the cache grows past its size cap.
+"""
+
+import hashlib
+import os
+import subprocess
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from transcoder import transcoder, TranscoderBusy
+
+cache_folder = os.getenv('CACHE_FOLDER', './cache')
+DEFAULT_MAX_BYTES = int(os.getenv('OPUS_CACHE_MAX_MB', '1024')) * 1024 * 1024
+
+
+def cache_key(file_path, gain_db=0.0, start=0.0):
+    """Return the content key for a source file and its playback adjustments"""
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return None
+    raw = f"{os.path.abspath(file_path)}|{stat.st_size}|{stat.st_mtime_ns}"
+    # Normalized encodes are separate entries; the plain one keeps its old key
+    if gain_db or start:
+        raw += f"|{gain_db:.1f}|{start:.2f}"
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+class OpusCache:
+    """Size-capped LRU cache of Ogg/Opus files on disk"""
+
+    def __init__(self, folder=None, max_bytes=DEFAULT_MAX_BYTES, bitrate=128):
+        self.folder = folder or os.path.join(cache_folder, 'opus')
+        self.max_bytes = max_bytes
+        self.bitrate = bitrate
+        self._entries = OrderedDict()  # key -> size, oldest first
+        self._total = 0
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='opus-cache')
+        self.hits = 0
+        self.misses = 0
+        self._load()
+
+    def _path_for(self, key):
+        return os.path.join(self.folder, f"{key}.ogg")
+
+    def _load(self):
+        """Index existing cache files, least recently used first"""
+        os.makedirs(self.folder, exist_ok=True)
+        found = []
+        for entry in os.scandir(self.folder):
+            if entry.name.endswith('.ogg') and entry.is_file():
+                stat = entry.stat()
+                found.append((stat.st_atime, entry.name[:-4], stat.st_size))
+            elif entry.name.endswith('.tmp'):
+                # Leftover from an interrupted encode
+                os.remove(entry.path)
+        for _, key, size in sorted(found):
+            self._entries[key] = size
+            self._total += size
+        self._evict()
+
+    def lookup(self, file_path, gain_db=0.0, start=0.0):
+        """Return the cached Ogg/Opus path for a source file, or None"""
+        key = cache_key(file_path, gain_db, start)
+        if key is None:
+            return None
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        cached_path = self._path_for(key)
+        try:
+            os.utime(cached_path)
+        except OSError:
+            # Removed behind our back, forget it
+            with self._lock:
+                self._total -= self._entries.pop(key, 0)
+            return None
+        return cached_path
+
+    def contains(self, file_path, gain_db=0.0, start=0.0):
+        """True if a source file has a cache entry, without touching LRU order"""
+        key = cache_key(file_path, gain_db, start)
+        with self._lock:
+            return key is not None and key in self._entries
+
+    def schedule(self, file_path, gain_db=0.0, start=0.0):
+        """Encode a source file into the cache in the background"""
+        key = cache_key(file_path, gain_db, start)
+        if key is None:
+            return
+        with self._lock:
+            if key in self._entries or key in self._pending:
+                return
+            self._pending.add(key)
+        self._executor.submit(self._encode, file_path, key, gain_db, start)
+
+    def _encode(self, file_path, key, gain_db=0.0, start=0.0):
+        cached_path = self._path_for(key)
+        tmp_path = cached_path + '.tmp'
+        # Static gain and silence trim are baked into the encode
+        seek = ['-ss', f'{start:.2f}'] if start else []
+        volume = ['-af', f'volume={gain_db:.1f}dB'] if gain_db else []
+        try:
+            transcoder.run(
+                ['ffmpeg', '-nostdin', '-loglevel', 'error', '-y', *seek, '-i', file_path,
+                 '-vn', '-map_metadata', '-1', *volume, '-c:a', 'libopus', '-b:a', f'{self.bitrate}k',
+                 '-frame_duration', '20', '-ar', '48000', '-ac', '2', '-f', 'ogg', tmp_path]
+            )
+            os.replace(tmp_path, cached_path)
+            size = os.path.getsize(cached_path)
+            with self._lock:
+                self._entries[key] = size
+                self._total += size
+                self._evict()
+            print(f"Cached Opus encode for {os.path.basename(file_path)}")
+        except (subprocess.CalledProcessError, FileNotFoundError, OSError, TranscoderBusy) as e:
+            print(f"Opus cache encode failed for {file_path}: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        finally:
+            with self._lock:
+                self._pending.discard(key)
+
+    def _evict(self):
+        """Drop least recently used entries until under the size cap"""
+        while self._total > self.max_bytes and len(self._entries) > 1:
+            key, size = self._entries.popitem(last=False)
+            self._total -= size
+            try:
+                os.remove(self._path_for(key))
+            except OSError:
+                pass
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._total,
+                "max_bytes": self.max_bytes,
+                "pending": len(self._pending),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+# Shared cache instance
+opus_cache = OpusCache()
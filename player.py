@@ -0,0 +1,476 @@
+"""
+Playback for guild sessions
+Builds audio sources, plays tracks and advances the per-guild queue. The
+next track in the queue is opened and its first frames buffered while the
+current one is still playing, so transitions need no ffmpeg spawn.
+"""
+
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import discord
+
+import loudness
+import metrics
+from catalog import catalog
+from crossfade import CrossfadeSource
+from event_bus import events
+from mixer import MixerSource
+from music_library import library, music_folder
+from ogg_source import FRAME_DURATION_MS, NativeOpusSource, is_native_opus
+from opus_cache import opus_cache
+from seek_index import seek_indexes
+from send_monitor import MonitoredSource
+from soundboard import MAX_SECONDS as CLIP_MAX_SECONDS, soundboard
+from transcoder import transcoder
+from volume import VolumeSource
+
+# Frames buffered ahead for the next track (20 ms each)
+PREFETCH_FRAMES = 50
+# Frames read before a track played right away is handed to the player
+PLAY_FRAMES = 1
+# Tracks that need ffmpeg are primed this long before the current one ends,
+# so their process does not hold a transcoder slot for a whole track
+PREFETCH_LEAD_SECONDS = 10
+# Transcoder slots a prefetch leaves free for live plays
+PREFETCH_RESERVED_SLOTS = 1
+# Effects layered at once over one track
+MAX_OVERLAYS = 4
+
+_prefetch_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='prefetch')
+
+
+def _catalog_row(file_path):
+    track = library.get(os.path.basename(file_path))
+    return catalog.get(track) if track else None
+
+
+def playback_params(file_path):
+    """Static gain and start offset precomputed by the catalog's loudness pass"""
+    return loudness.playback_params(_catalog_row(file_path))
+
+
+def track_frames(file_path, position=0.0):
+    """20 ms frames left before a track's trailing silence, or None if unknown"""
+    row = _catalog_row(file_path)
+    if row is None or row['duration'] is None:
+        return None
+    _, start = loudness.playback_params(row)
+    if loudness.NORMALIZE:
+        end = row['duration'] - (row['trail_silence'] or 0.0)
+    else:
+        end = row['duration']
+    return max(0, int((end - start - position) * 1000 // FRAME_DURATION_MS))
+
+
+def is_clip(file_path):
+    """True for tracks short enough to be served as soundboard clips"""
+    row = _catalog_row(file_path)
+    return row is not None and row['duration'] is not None and row['duration'] <= CLIP_MAX_SECONDS
+
+
+def open_ogg_at(file_path, seconds):
+    """Native Opus source positioned through the file's seek index"""
+    if not seconds:
+        return NativeOpusSource(file_path)
+    offset, packets = seek_indexes.ogg_position(file_path, seconds)
+    return NativeOpusSource(file_path, start=packets * FRAME_DURATION_MS / 1000, offset=offset)
+
+
+def create_audio_source(file_path, position=0.0, wait_for_slot=True):
+    """Build an audio source, avoiding ffmpeg whenever Opus packets are on disk
+
+    With wait_for_slot False, TranscoderBusy is raised at once when no
+    ffmpeg slot is free instead of queueing for one.
+    """
+    gain, start = playback_params(file_path)
+
+    # Short clips are served from a shared memory map
+    clip = soundboard.open(file_path, gain, start, position)
+    if clip is not None:
+        return clip
+
+    # Tracks stored as Ogg/Opus are read in-process; packets can be skipped
+    # for the start offset but need a re-encode to change their gain
+    if is_native_opus(file_path) and not gain:
+        if is_clip(file_path):
+            soundboard.schedule(file_path, file_path, gain, start, skip_seconds=start)
+        return open_ogg_at(file_path, start + position)
+
+    # Cache entries are 20 ms Ogg/Opus with gain and trim baked in
+    cached_path = opus_cache.lookup(file_path, gain, start)
+    if cached_path:
+        if is_clip(file_path):
+            soundboard.schedule(file_path, cached_path, gain, start)
+        return open_ogg_at(cached_path, position)
+
+    # Cache miss: transcode live this time and encode in the background for next time
+    opus_cache.schedule(file_path, gain, start)
+    before_options = f'-ss {start:.2f}' if start else None
+    options = f'-af volume={gain:.1f}dB' if gain else None
+    if position and file_path.lower().endswith('.mp3'):
+        # Jump straight to the indexed frame and decode only the remainder
+        offset, residual = seek_indexes.mp3_position(file_path, start + position)
+        before_options = f'-skip_initial_bytes {offset}'
+        options = ' '.join(filter(None, (f'-ss {residual:.3f}' if residual else None, options)))
+    elif position:
+        before_options = f'-ss {start + position:.2f}'
+    return transcoder.open(
+        lambda: discord.FFmpegOpusAudio(file_path, before_options=before_options, options=options),
+        wait=wait_for_slot
+    )
+
+
+def needs_transcoder(file_path):
+    """True if playing a file would spawn ffmpeg"""
+    gain, start = playback_params(file_path)
+    if soundboard.contains(file_path, gain, start):
+        return False
+    if is_native_opus(file_path) and not gain:
+        return False
+    return not opus_cache.contains(file_path, gain, start)
+
+
+def warm_soundboard():
+    """Build clips for short tracks already in the catalog, encoding them first if needed"""
+    for track in library.tracks():
+        if not is_clip(track.path):
+            continue
+        gain, start = playback_params(track.path)
+        if is_native_opus(track.path) and not gain:
+            soundboard.schedule(track.path, track.path, gain, start, skip_seconds=start)
+        elif opus_cache.contains(track.path, gain, start):
+            soundboard.schedule(track.path, opus_cache.lookup(track.path, gain, start), gain, start)
+        else:
+            # The clip is built on the first play after this encode lands
+            opus_cache.schedule(track.path, gain, start)
+
+
+class PrefetchedSource(discord.AudioSource):
+    """Audio source opened and primed off the playback path
+
+    Queue heads are primed deeply on the prefetch pool and never wait for
+    a transcoder slot there; tracks played right away are opened by
+    open() in the caller's thread and only read their first frame.
+    """
+
+    def __init__(self, filename, position=0.0, frames=PREFETCH_FRAMES):
+        self.filename = filename
+        self.file_path = os.path.join(music_folder, filename)
+        self.position = position
+        self.frames = frames
+        self.frames_played = 0
+        self._source = None
+        self._buffer = []
+        self._error = None
+        self._ready = threading.Event()
+        self._cancelled = False
+        self._started = False
+
+    def start(self):
+        """Open the source and buffer its first frames in the background"""
+        self._started = True
+        _prefetch_executor.submit(self._prime, False)
+        return self
+
+    def open(self):
+        """Open and prime in this thread unless start() already did, then wait"""
+        if not self._started:
+            self._started = True
+            self._prime(True)
+        self.wait()
+
+    def _prime(self, wait_for_slot):
+        try:
+            self._source = create_audio_source(self.file_path, self.position, wait_for_slot)
+            for _ in range(self.frames):
+                if self._cancelled:
+                    break
+                frame = self._source.read()
+                if not frame:
+                    break
+                self._buffer.append(frame)
+        except Exception as e:
+            self._error = e
+            print(f"Prefetch failed for {self.filename}: {e}")
+        finally:
+            self._ready.set()
+            if self._cancelled:
+                self._close()
+
+    def wait(self):
+        """Block until primed, raising whatever made opening the source fail"""
+        self._ready.wait()
+        if self._error is not None:
+            raise self._error
+
+    def read(self):
+        # A failed open ends up in the player's after(error), not as silence
+        self.wait()
+        if self._buffer:
+            frame = self._buffer.pop(0)
+        elif self._source is None:
+            return b''
+        else:
+            frame = self._source.read()
+        if frame:
+            self.frames_played += 1
+        return frame
+
+    @property
+    def ready(self):
+        """True once primed, so reading will not block"""
+        return self._ready.is_set() and not self._cancelled
+
+    @property
+    def elapsed(self):
+        """Seconds into the track, counting the position it was opened at"""
+        return self.position + self.frames_played * FRAME_DURATION_MS / 1000
+
+    def is_opus(self):
+        # Everything built by create_audio_source yields Opus packets
+        return True
+
+    def cleanup(self):
+        self._cancelled = True
+        if self._ready.is_set():
+            self._close()
+
+    def _close(self):
+        if self._source is not None:
+            self._source.cleanup()
+            self._source = None
+        self._buffer.clear()
+
+
+def _take_prefetched(session, filename, position=0.0):
+    """Return the prefetched source for a track, dropping any stale one"""
+    prefetched = session.prefetched
+    session.prefetched = None
+    if prefetched is not None:
+        # A prefetch that found no free slot is retried below, waiting for one
+        usable = not (prefetched.ready and prefetched._error is not None)
+        if prefetched.filename == filename and not position and usable:
+            return prefetched
+        prefetched.cleanup()
+
+    # Refuse up front rather than queue for a slot that cannot come
+    if needs_transcoder(os.path.join(music_folder, filename)):
+        transcoder.check_admission()
+    return PrefetchedSource(filename, position, frames=PLAY_FRAMES)
+
+
+def _seconds_left(session):
+    """Seconds before the current track ends, or None if unknown"""
+    source = session.source
+    if source is None:
+        return None
+    frames = track_frames(source.file_path, source.position)
+    if frames is None:
+        return None
+    return (frames - source.frames_played) * FRAME_DURATION_MS / 1000
+
+
+def prefetch_next(session):
+    """Prime the head of the queue while the current track plays"""
+    if session.prefetch_timer is not None:
+        session.prefetch_timer.cancel()
+        session.prefetch_timer = None
+    if not session.queue:
+        if session.prefetched is not None:
+            session.prefetched.cleanup()
+            session.prefetched = None
+        return
+    head = session.queue[0]
+    if session.prefetched is not None and session.prefetched.filename == head:
+        return
+    if session.prefetched is not None:
+        session.prefetched.cleanup()
+        session.prefetched = None
+
+    if needs_transcoder(os.path.join(music_folder, head)):
+        left = _seconds_left(session)
+        if left is not None:
+            delay = left - PREFETCH_LEAD_SECONDS - session.crossfade
+            if delay > 0:
+                # Checked again when the timer fires, in case of a pause or seek
+                loop = asyncio.get_running_loop()
+                session.prefetch_timer = loop.call_later(delay, prefetch_next, session)
+                return
+        if transcoder.free_slots() <= PREFETCH_RESERVED_SLOTS:
+            # Keep the budget for live plays; play_next opens the track itself
+            return
+    session.prefetched = PrefetchedSource(head).start()
+
+
+def _voice_source(session, output):
+    """Wrap the session's output with its volume stage and send monitor"""
+    return MonitoredSource(VolumeSource(output, session), session.send_stats)
+
+
+async def play_track(session, filename, position=0.0):
+    """Play a track right away, replacing whatever is playing
+
+    Returns once the source is open, so a failure reaches the caller
+    instead of ending as a silent track.
+    """
+    source = _take_prefetched(session, filename, position)
+    try:
+        await asyncio.to_thread(source.open)
+    except Exception:
+        source.cleanup()
+        raise
+
+    voice_client = session.voice_client
+    if voice_client is None:
+        # Disconnected while the source was opening
+        source.cleanup()
+        return
+
+    # A new generation stops the old track's after callback from advancing the queue
+    session.generation += 1
+    generation = session.generation
+    if voice_client.is_playing() or voice_client.is_paused():
+        voice_client.stop()
+
+    loop = asyncio.get_running_loop()
+
+    def after_playing(error):
+        if error:
+            metrics.playback_errors.inc()
+            print(f'Playback finished with error: {error}')
+        else:
+            print('Playback finished successfully')
+        # A crossfade chain may have moved on to later tracks
+        last = session.current_track if session.generation == generation else filename
+        events.publish('track_stop', {"guild_id": str(session.guild_id), "track": last})
+        if session.generation == generation:
+            asyncio.run_coroutine_threadsafe(play_next(session, generation), loop)
+
+    output = source
+    if session.crossfade > 0:
+        output = CrossfadeSource(
+            source,
+            track_frames(source.file_path, position),
+            int(session.crossfade * 1000 // FRAME_DURATION_MS),
+            next_track=lambda: _crossfade_next(session, generation),
+            on_advance=lambda next_source: loop.call_soon_threadsafe(
+                _crossfade_advanced, session, next_source, generation
+            ),
+        )
+    voice_client.play(_voice_source(session, output), after=after_playing)
+    session.current_track = filename
+    session.source = source
+    session.output = output
+    session.mixer = None
+    print(f"Using Opus audio source for {filename}")
+    events.publish('track_start', {"guild_id": str(session.guild_id), "track": filename})
+    prefetch_next(session)
+
+
+def _crossfade_next(session, generation):
+    """Hand the primed head of the queue to a crossfade chain (audio thread)"""
+    prefetched = session.prefetched
+    if session.generation != generation or prefetched is None or not prefetched.ready:
+        return None
+    if prefetched._error is not None:
+        # Leave it to play_next, which reports the failure
+        return None
+    session.prefetched = None
+    return prefetched, track_frames(prefetched.file_path)
+
+
+def _crossfade_advanced(session, source, generation):
+    """Bring session state in line once a chain moved to the next track"""
+    if session.generation != generation:
+        return
+    if session.queue and session.queue[0] == source.filename:
+        session.queue.popleft()
+    events.publish('track_stop', {"guild_id": str(session.guild_id), "track": session.current_track})
+    session.current_track = source.filename
+    session.source = source
+    events.publish('track_start', {"guild_id": str(session.guild_id), "track": source.filename})
+    prefetch_next(session)
+
+
+async def play_next(session, generation=None):
+    """Advance to the next queued track that opens, if any"""
+    failed = []
+    async with session.lock:
+        if not session.is_connected():
+            return
+        if generation is not None and session.generation != generation:
+            # Another track was started while this call waited for the lock
+            return
+        while session.queue:
+            filename = session.queue.popleft()
+            try:
+                await play_track(session, filename)
+                break
+            except Exception as e:
+                # Skip it rather than strand the rest of the queue
+                metrics.playback_errors.inc()
+                print(f"Failed to play audio {filename}: {e}")
+                failed.append((filename, e))
+        else:
+            session.current_track = None
+
+    for filename, error in failed:
+        await notify(session, f"❌ Failed to play `{filename}`, skipped: {error}")
+
+
+async def notify(session, message):
+    """Post to the channel the guild's last play command came from"""
+    if session.text_channel is None:
+        return
+    try:
+        await session.text_channel.send(message)
+    except Exception as e:
+        print(f"Could not notify guild {session.guild_id}: {e}")
+
+
+def enqueue(session, filename, front=False):
+    """Add a track to the queue and prime it if it is next up"""
+    if front:
+        session.queue.appendleft(filename)
+    else:
+        session.queue.append(filename)
+    if session.is_playing():
+        prefetch_next(session)
+
+
+def skip(session):
+    """Stop the current track and let the after callback start the next one"""
+    session.voice_client.stop()
+
+
+def overlay(session, source, gain=1.0):
+    """Layer an opened source over the playing track through the session's mixer"""
+    mixer = session.mixer
+    if mixer is None:
+        # Swap the player's source in place: the track keeps playing, now mixed
+        mixer = MixerSource(session.output)
+        session.voice_client.source = _voice_source(session, mixer)
+        session.mixer = session.output = mixer
+    if mixer.overlays >= MAX_OVERLAYS:
+        source.cleanup()
+        return False
+    mixer.add(source, gain)
+    return True
+
+
+async def seek(session, seconds):
+    """Restart the current track at an offset, keeping the queue"""
+    await play_track(session, session.current_track, position=seconds)
+
+
+def stop(session):
+    """Stop playback and clear the queue, remembering where it stopped"""
+    session.save_resume_point()
+    session.close()
+    if session.voice_client is not None:
+        session.voice_client.stop()
+    session.current_track = None
+    session.source = session.output = session.mixer = None
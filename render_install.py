@@ -22,9 +22,9 @@ def install_ffmpeg_render():
             capture_output=True, text=True, check=True
         )
         
-        # Verify installation
-        version_result = subprocess.run(['ffmpeg', '-version'], capture_output=True, text=True)
-        if version_result.returncode == 0:
+        # Verify installation (and record the new binary's capabilities)
+        from ffmpeg_capabilities import capabilities
+        if capabilities.refresh(force=True)["available"]:
             print("✅ FFmpeg installed successfully on Render!")
             return True
         else:
@@ -40,11 +40,8 @@ def install_ffmpeg_render():
 
 def check_ffmpeg():
     """Check if FFmpeg is already installed"""
-    try:
-        result = subprocess.run(['ffmpeg', '-version'], capture_output=True)
-        return result.returncode == 0
-    except FileNotFoundError:
-        return False
+    from ffmpeg_capabilities import capabilities
+    return capabilities.snapshot()["available"]
 
 if __name__ == "__main__":
     if check_ffmpeg():
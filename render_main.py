@@ -6,8 +6,6 @@ Automatically detects environment (Render vs Replit) and adapts accordingly
 
 import os
 import sys
-import threading
-import time
 
 def detect_environment():
     """Detect if running on Render or Replit"""
@@ -36,15 +34,18 @@ def install_ffmpeg_for_environment():
             print("⚠️ install_ffmpeg module not found")
     else:
         print("🌍 Unknown environment, attempting basic FFmpeg check")
-        import subprocess
-        try:
-            subprocess.run(['ffmpeg', '-version'], check=True, capture_output=True)
+        from ffmpeg_capabilities import capabilities
+        if capabilities.snapshot()["available"]:
             print("FFmpeg already available")
-        except:
+        else:
             print("⚠️ FFmpeg not found - some features may not work")
 
 def get_port():
     """Get port based on environment"""
+    # Cluster workers get an internal port from the launcher
+    if os.getenv('CLUSTER_PORT'):
+        return int(os.getenv('CLUSTER_PORT'))
+    
     env = detect_environment()
     
     if env == 'render':
@@ -54,35 +55,35 @@ def get_port():
         # Replit and others use 5000
         return 5000
 
-def start_keep_alive_server():
-    """Start the Flask keep-alive server"""
-    from keep_alive import app
-    port = get_port()
-    host = '0.0.0.0'
-    
-    print(f"🌐 Starting keep-alive server on {host}:{port}")
-    app.run(host=host, port=port, debug=False)
-
 def start_discord_bot():
-    """Start the Discord bot"""
+    """Start the Discord bot (the keep-alive server runs on its event loop)"""
     print("🤖 Starting Discord bot...")
     
     # Import and run the main function from main.py
     from main import main as run_bot
-    run_bot()
+    run_bot(port=get_port())
+
+def start_clusters(clusters):
+    """Split the shards across worker processes and serve the aggregated dashboard"""
+    print(f"🧩 Starting {clusters} shard clusters...")
+    from cluster import run_clusters
+    run_clusters(clusters, get_port())
 
 if __name__ == "__main__":
+    # Workers are launched by the cluster launcher, which already installed FFmpeg
+    if os.getenv('CLUSTER_ID'):
+        start_discord_bot()
+        sys.exit(0)
+    
     print("🚀 Starting Discord Music Bot...")
     
     # Install FFmpeg first
     install_ffmpeg_for_environment()
     
-    # Start Flask server in background thread
-    flask_thread = threading.Thread(target=start_keep_alive_server, daemon=True)
-    flask_thread.start()
-    
-    # Give Flask a moment to start
-    time.sleep(2)
-    
-    # Start Discord bot (this will block)
-    start_discord_bot()
\ No newline at end of file
+    # CLUSTERS > 1 runs one bot process per group of shards
+    clusters = int(os.getenv('CLUSTERS', '1'))
+    if clusters > 1:
+        start_clusters(clusters)
+    else:
+        # Start Discord bot and its keep-alive server (this will block)
+        start_discord_bot()
\ No newline at end of file
@@ -0,0 +1,128 @@
+"""
+Fuzzy search over the music library
+Titles are normalized (case, accents, punctuation) and indexed by trigram
+and by word prefix, so partial or misspelled queries like "apocalypse" or
+"roi shon" resolve to a track quickly enough for Discord autocomplete.
+"""
+
+import bisect
+import re
+import threading
+import unicodedata
+from collections import Counter
+
+from music_library import library
+
+# Candidates kept from the trigram pass before full scoring
+MAX_CANDIDATES = 200
+# Minimum score for resolve() to accept a fuzzy match
+MIN_RESOLVE_SCORE = 0.5
+
+_NON_ALNUM = re.compile(r'[^a-z0-9]+')
+
+
+def normalize(text):
+    """Lowercase, strip accents and collapse punctuation to single spaces"""
+    decomposed = unicodedata.normalize('NFKD', text)
+    stripped = ''.join(c for c in decomposed if not unicodedata.combining(c))
+    return _NON_ALNUM.sub(' ', stripped.lower()).strip()
+
+
+def trigrams(normalized):
+    padded = f" {normalized} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class SearchIndex:
+    """Trigram and word-prefix index rebuilt when the library changes"""
+
+    def __init__(self, source):
+        self.source = source
+        self._version = None
+        self._lock = threading.Lock()
+        self._tracks = ()
+        self._titles = []
+        self._grams = []
+        self._postings = {}
+        self._words = []  # sorted (word, track index) pairs for prefix lookups
+
+    def _ensure(self):
+        # Lets the library pick up folder changes before comparing versions
+        self.source.tracks()
+        if self._version == self.source.version:
+            return
+        with self._lock:
+            if self._version == self.source.version:
+                return
+            version = self.source.version
+            tracks = self.source.tracks()
+            titles = [normalize(track.title) for track in tracks]
+            grams = [trigrams(title) for title in titles]
+            postings = {}
+            words = []
+            for i, title in enumerate(titles):
+                for gram in grams[i]:
+                    postings.setdefault(gram, []).append(i)
+                words.extend((word, i) for word in set(title.split()))
+            words.sort()
+            self._tracks, self._titles, self._grams = tracks, titles, grams
+            self._postings, self._words = postings, words
+            self._version = version
+
+    def _prefix_matches(self, prefix):
+        """Track indices having a word that starts with prefix"""
+        start = bisect.bisect_left(self._words, (prefix, -1))
+        found = set()
+        for word, i in self._words[start:]:
+            if not word.startswith(prefix):
+                break
+            found.add(i)
+        return found
+
+    def search(self, query, limit=25):
+        """Return (track, score) pairs ranked best first"""
+        self._ensure()
+        nq = normalize(query)
+        if not nq:
+            return [(track, 0.0) for track in self._tracks[:limit]]
+
+        query_grams = trigrams(nq)
+        hits = Counter()
+        for gram in query_grams:
+            hits.update(self._postings.get(gram, ()))
+        candidates = {i for i, _ in hits.most_common(MAX_CANDIDATES)}
+
+        query_words = nq.split()
+        prefix_sets = [self._prefix_matches(word) for word in query_words]
+        for matches in prefix_sets:
+            candidates.update(matches)
+
+        scored = []
+        for i in candidates:
+            title = self._titles[i]
+            # Share of the query's trigrams found in the title
+            shared = len(query_grams & self._grams[i])
+            score = shared / len(query_grams)
+            words_hit = sum(1 for matches in prefix_sets if i in matches)
+            score += words_hit / len(query_words)
+            if title == nq:
+                score += 2.0
+            elif title.startswith(nq):
+                score += 1.0
+            elif nq in title:
+                score += 0.5
+            scored.append((score, i))
+
+        scored.sort(key=lambda item: (-item[0], self._titles[item[1]]))
+        return [(self._tracks[i], score) for score, i in scored[:limit]]
+
+    def resolve(self, query):
+        """Best matching track for a query, or None when nothing is close"""
+        results = self.search(query, limit=1)
+        if results and results[0][1] >= MIN_RESOLVE_SCORE:
+            return results[0][0]
+        return None
+
+
+# Shared index over the shared library
+search_index = SearchIndex(library)
@@ -0,0 +1,154 @@
+"""
+Per-track seek index
+Maps a time offset to a byte offset without scanning the file: MP3 frame
+offsets sampled every SEEK_STEP seconds, and Ogg page offsets with their
+granule positions for Opus files and cache entries. Each index is built
+once, kept in memory and persisted next to the Opus cache.
+"""
+
+import bisect
+import json
+import os
+import struct
+import threading
+
+from audio_metadata import find_first_frame, parse_frame_header, read_id3v2
+from opus_cache import cache_folder, cache_key
+
+# Granularity of the MP3 index, in seconds
+SEEK_STEP = 1.0
+OPUS_SAMPLE_RATE = 48000
+OPUS_FRAME_SAMPLES = 960  # 20 ms at 48 kHz
+
+
+def build_mp3_index(file_path):
+    """Byte offsets of the MPEG frames starting each SEEK_STEP interval"""
+    with open(file_path, 'rb') as f:
+        _, audio_start = read_id3v2(f)
+        offset, header = find_first_frame(f, audio_start)
+        if header is None:
+            return None
+        frame_seconds = header.samples / header.sample_rate
+        frames_per_step = max(1, round(SEEK_STEP / frame_seconds))
+
+        offsets = []
+        f.seek(offset)
+        data = f.read()
+
+    pos = 0
+    frame = 0
+    while pos + 4 <= len(data):
+        current = parse_frame_header(data, pos)
+        if current is None:
+            # Lost sync (junk or trailing tag): search for the next frame
+            next_sync = data.find(b'\xff', pos + 1)
+            if next_sync == -1:
+                break
+            pos = next_sync
+            continue
+        if frame % frames_per_step == 0:
+            offsets.append(offset + pos)
+        frame += 1
+        pos += current.length
+
+    return {
+        "kind": "mp3",
+        "step": frames_per_step * frame_seconds,
+        "offsets": offsets,
+    }
+
+
+def build_ogg_index(file_path):
+    """Granule position and byte offset of every Ogg page that starts a packet"""
+    granules = []
+    offsets = []
+    pre_skip = 0
+    with open(file_path, 'rb') as f:
+        data = f.read()
+
+    pos = data.find(b'OggS')
+    previous_granule = 0
+    while pos != -1 and pos + 27 <= len(data):
+        header_type = data[pos + 5]
+        granule = struct.unpack('<q', data[pos + 6:pos + 14])[0]
+        segments = data[pos + 26]
+        table = data[pos + 27:pos + 27 + segments]
+        body = pos + 27 + segments
+        if data[body:body + 8] == b'OpusHead':
+            pre_skip = struct.unpack('<H', data[body + 10:body + 12])[0]
+        # Only pages that begin with a fresh packet are safe entry points;
+        # a page starts at the granule where the previous one ended
+        elif not header_type & 0x01 and granule > 0:
+            granules.append(previous_granule)
+            offsets.append(pos)
+        if granule > 0:
+            previous_granule = granule
+        pos = data.find(b'OggS', body + sum(table))
+
+    return {"kind": "ogg", "pre_skip": pre_skip, "granules": granules, "offsets": offsets}
+
+
+class SeekIndexStore:
+    """Lazily built, persisted seek indexes keyed like the Opus cache"""
+
+    def __init__(self, folder=None):
+        self.folder = folder or os.path.join(cache_folder, 'seek')
+        self._indexes = {}
+        self._lock = threading.Lock()
+
+    def get(self, file_path):
+        """Seek index for a file, building and persisting it on first use"""
+        key = cache_key(file_path)
+        if key is None:
+            return None
+        with self._lock:
+            index = self._indexes.get(key)
+        if index is not None:
+            return index
+
+        index_path = os.path.join(self.folder, f"{key}.json")
+        try:
+            with open(index_path, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            index = None
+
+        if index is None:
+            if file_path.lower().endswith('.mp3'):
+                index = build_mp3_index(file_path)
+            else:
+                index = build_ogg_index(file_path)
+            if index is None:
+                return None
+            try:
+                os.makedirs(self.folder, exist_ok=True)
+                with open(index_path, 'w', encoding='utf-8') as f:
+                    json.dump(index, f)
+            except OSError as e:
+                print(f"Could not persist seek index for {file_path}: {e}")
+
+        with self._lock:
+            self._indexes[key] = index
+        return index
+
+    def mp3_position(self, file_path, seconds):
+        """(byte offset, remaining seconds to skip after decoding starts)"""
+        index = self.get(file_path)
+        if not index or not index["offsets"]:
+            return 0, seconds
+        slot = min(int(seconds // index["step"]), len(index["offsets"]) - 1)
+        return index["offsets"][slot], max(0.0, seconds - slot * index["step"])
+
+    def ogg_position(self, file_path, seconds):
+        """(byte offset, 20 ms packets to drop after that offset)"""
+        index = self.get(file_path)
+        if not index or not index["offsets"]:
+            return None, int(seconds * 1000 // 20)
+        target = index["pre_skip"] + int(seconds * OPUS_SAMPLE_RATE)
+        slot = max(0, bisect.bisect_right(index["granules"], target) - 1)
+        skip = (target - index["granules"][slot]) // OPUS_FRAME_SAMPLES
+        return index["offsets"][slot], max(0, skip)
+
+
+# Shared store
+seek_indexes = SeekIndexStore()
@@ -0,0 +1,113 @@
+"""
+Audio send-loop monitor
+Wraps the source handed to voice_client.play and times every read against
+the 20 ms schedule discord's audio player keeps, so stutter can be traced
+to a slow source (ffmpeg, disk) or to a late send loop (a loaded host).
+"""
+
+import threading
+import time
+from collections import deque
+
+import discord
+
+import metrics
+
+FRAME_SECONDS = 0.02
+# A read slower than this is counted as a stall
+STALL_SECONDS = 0.005
+# A frame this late is audible as a gap
+UNDERRUN_SECONDS = FRAME_SECONDS
+# Gaps longer than this are pauses, not lateness; the schedule restarts
+PAUSE_SECONDS = 0.5
+WINDOW = 500  # frames kept for percentiles, 10 s of audio
+
+underruns = metrics.registry.register(metrics.Counter(
+    'botmusique_audio_underruns_total', "Frames sent a full frame or more behind schedule"
+))
+read_stalls = metrics.registry.register(metrics.Counter(
+    'botmusique_audio_read_stalls_total', "Source reads slower than the stall threshold"
+))
+
+
+def _percentile(ordered, pct):
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, int(pct / 100 * len(ordered)))]
+
+
+class SendStats:
+    """Rolling send lateness and read timings for one guild"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._lateness = deque(maxlen=WINDOW)
+        self._reads = deque(maxlen=WINDOW)
+        self.frames = 0
+        self.stalls = 0
+        self.underruns = 0
+        self.max_lateness = 0.0
+        self.max_read = 0.0
+
+    def record(self, lateness, read_time):
+        with self._lock:
+            self.frames += 1
+            self._lateness.append(lateness)
+            self._reads.append(read_time)
+            self.max_lateness = max(self.max_lateness, lateness)
+            self.max_read = max(self.max_read, read_time)
+            if read_time > STALL_SECONDS:
+                self.stalls += 1
+                read_stalls.inc()
+            if lateness >= UNDERRUN_SECONDS:
+                self.underruns += 1
+                underruns.inc()
+
+    def summary(self):
+        """Milliseconds and counts, JSON-friendly"""
+        with self._lock:
+            lateness = sorted(self._lateness)
+            reads = sorted(self._reads)
+            summary = {
+                "frames": self.frames,
+                "stalls": self.stalls,
+                "underruns": self.underruns,
+                "max_late_ms": round(self.max_lateness * 1000, 1),
+                "max_read_ms": round(self.max_read * 1000, 1),
+            }
+        for name, values in (("late", lateness), ("read", reads)):
+            for pct in (50, 99):
+                value = _percentile(values, pct)
+                summary[f"{name}_p{pct}_ms"] = round(value * 1000, 2) if value is not None else None
+        return summary
+
+
+class MonitoredSource(discord.AudioSource):
+    """Pass-through source that records timings into a SendStats"""
+
+    def __init__(self, source, stats):
+        self._source = source
+        self._stats = stats
+        self._start = None
+        self._loops = 0
+        self._last_read = None
+
+    def read(self):
+        now = time.perf_counter()
+        if self._start is None or now - self._last_read > PAUSE_SECONDS:
+            # First frame, or resumed after a pause: the player restarts its clock too
+            self._start = now
+            self._loops = 0
+        lateness = max(0.0, now - (self._start + self._loops * FRAME_SECONDS))
+        frame = self._source.read()
+        self._last_read = time.perf_counter()
+        self._loops += 1
+        if frame:
+            self._stats.record(lateness, self._last_read - now)
+        return frame
+
+    def is_opus(self):
+        return self._source.is_opus()
+
+    def cleanup(self):
+        self._source.cleanup()
@@ -0,0 +1,154 @@
+"""
+Soundboard clips
+Short tracks are repacked from their Ogg/Opus encode into a flat frame file
+(a packet offset table followed by the raw Opus packets) that playback
+memory-maps. Clips then start with no subprocess and no Ogg parsing, and
+every guild playing the same clip shares one mapping and its pages.
+"""
+
+import mmap
+import os
+import struct
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import discord
+
+from ogg_source import FRAME_DURATION_MS, iter_audio_packets
+from opus_cache import cache_folder, cache_key
+
+# Tracks up to this long are played as soundboard clips
+MAX_SECONDS = float(os.getenv('SOUNDBOARD_MAX_SECONDS', '15'))
+MAGIC = b'BMSB'
+_HEADER = struct.Struct('<4sI')
+
+
+def write_frame_file(ogg_path, frame_path, skip_packets=0):
+    """Repack the audio packets of an Ogg/Opus file into a frame file"""
+    with open(ogg_path, 'rb') as f:
+        packets = list(iter_audio_packets(f))[skip_packets:]
+    offsets = [0]
+    for packet in packets:
+        offsets.append(offsets[-1] + len(packet))
+    tmp_path = frame_path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(_HEADER.pack(MAGIC, len(packets)))
+        f.write(struct.pack(f'<{len(offsets)}I', *offsets))
+        for packet in packets:
+            f.write(packet)
+    os.replace(tmp_path, frame_path)
+
+
+class FrameFile:
+    """Read-only memory map of a frame file"""
+
+    def __init__(self, frame_path):
+        with open(frame_path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.count = _HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            self._map.close()
+            raise ValueError(f"{frame_path} is not a soundboard frame file")
+        self._table = _HEADER.size
+        self._data = self._table + 4 * (self.count + 1)
+
+    def packet(self, index):
+        start, end = struct.unpack_from('<II', self._map, self._table + 4 * index)
+        # One small copy: the voice client encrypts from bytes
+        return self._map[self._data + start:self._data + end]
+
+
+class SoundboardSource(discord.AudioSource):
+    """Opus packets served straight from a shared memory map"""
+
+    def __init__(self, frames, start_packet=0):
+        self._frames = frames
+        self._index = start_packet
+
+    def read(self):
+        if self._frames is None or self._index >= self._frames.count:
+            return b''
+        packet = self._frames.packet(self._index)
+        self._index += 1
+        return packet
+
+    def is_opus(self):
+        return True
+
+    def cleanup(self):
+        # The mapping is shared with other guilds and stays open
+        self._frames = None
+
+
+class Soundboard:
+    """Frame files for short tracks, built in the background on first play"""
+
+    def __init__(self, folder=None):
+        self.folder = folder or os.path.join(cache_folder, 'soundboard')
+        self._frames = {}  # key -> FrameFile
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='soundboard')
+        os.makedirs(self.folder, exist_ok=True)
+
+    def _path_for(self, key):
+        return os.path.join(self.folder, f"{key}.frames")
+
+    def _load(self, key):
+        with self._lock:
+            frames = self._frames.get(key)
+        if frames is not None:
+            return frames
+        frame_path = self._path_for(key)
+        if not os.path.exists(frame_path):
+            return None
+        try:
+            frames = FrameFile(frame_path)
+        except (OSError, ValueError) as e:
+            print(f"Could not map soundboard clip {frame_path}: {e}")
+            return None
+        with self._lock:
+            return self._frames.setdefault(key, frames)
+
+    def contains(self, file_path, gain_db=0.0, start=0.0):
+        key = cache_key(file_path, gain_db, start)
+        return key is not None and self._load(key) is not None
+
+    def open(self, file_path, gain_db=0.0, start=0.0, position=0.0):
+        """Source for a built clip, or None"""
+        key = cache_key(file_path, gain_db, start)
+        frames = self._load(key) if key is not None else None
+        if frames is None:
+            return None
+        return SoundboardSource(frames, int(position * 1000 // FRAME_DURATION_MS))
+
+    def schedule(self, file_path, ogg_path, gain_db=0.0, start=0.0, skip_seconds=0.0):
+        """Build the clip for a track from its Ogg/Opus packets in the background"""
+        key = cache_key(file_path, gain_db, start)
+        if key is None:
+            return
+        with self._lock:
+            if key in self._frames or key in self._pending:
+                return
+            self._pending.add(key)
+        skip = int(skip_seconds * 1000 // FRAME_DURATION_MS)
+        self._executor.submit(self._build, key, ogg_path, skip, os.path.basename(file_path))
+
+    def _build(self, key, ogg_path, skip_packets, name):
+        try:
+            write_frame_file(ogg_path, self._path_for(key), skip_packets)
+            self._load(key)
+            print(f"Built soundboard clip for {name}")
+        except Exception as e:
+            print(f"Soundboard build failed for {name}: {e}")
+        finally:
+            with self._lock:
+                self._pending.discard(key)
+
+    def stats(self):
+        with self._lock:
+            return {"clips": len(self._frames), "pending": len(self._pending)}
+
+
+# Shared soundboard
+soundboard = Soundboard()
@@ -0,0 +1,152 @@
+"""
+Central budget for ffmpeg processes
+Every ffmpeg spawn (live transcodes and background cache encodes) takes a
+slot from the shared TranscoderManager. When all slots are busy, requests
+wait in a bounded queue and are rejected once that queue is full, instead
+of forking without limit.
+"""
+
+import itertools
+import os
+import subprocess
+import threading
+import time
+
+import discord
+
+import metrics
+
+MAX_ACTIVE = int(os.getenv('FFMPEG_MAX_PROCESSES', '8'))
+MAX_WAITING = int(os.getenv('FFMPEG_MAX_WAITING', '16'))
+WAIT_TIMEOUT = float(os.getenv('FFMPEG_WAIT_TIMEOUT', '10'))
+
+
+class TranscoderBusy(Exception):
+    """Raised when the ffmpeg budget is exhausted"""
+
+    def __init__(self, message="Trop de lectures en cours, réessayez dans quelques secondes"):
+        super().__init__(message)
+
+
+class TranscodedSource(discord.AudioSource):
+    """FFmpeg audio source that gives its slot back on cleanup"""
+
+    def __init__(self, source, manager, slot):
+        self._source = source
+        self._manager = manager
+        self._slot = slot
+
+    def read(self):
+        return self._source.read()
+
+    def is_opus(self):
+        return self._source.is_opus()
+
+    def cleanup(self):
+        try:
+            self._source.cleanup()
+        finally:
+            self._manager.release(self._slot)
+
+
+class TranscoderManager:
+    """Concurrency limit and bookkeeping for ffmpeg processes"""
+
+    def __init__(self, max_active=MAX_ACTIVE, max_waiting=MAX_WAITING, wait_timeout=WAIT_TIMEOUT):
+        self.max_active = max_active
+        self.max_waiting = max_waiting
+        self.wait_timeout = wait_timeout
+        self._cond = threading.Condition()
+        self._active = {}  # slot -> subprocess.Popen or None while starting
+        self._waiting = 0
+        self._slots = itertools.count()
+        self.spawned = 0
+        self.rejected = 0
+
+    def _reap_locked(self):
+        """Free slots whose ffmpeg process already exited"""
+        for slot, process in list(self._active.items()):
+            if process is not None and process.poll() is not None:
+                del self._active[slot]
+                self._cond.notify()
+
+    def check_admission(self):
+        """Raise TranscoderBusy right away if a new request could not even queue"""
+        with self._cond:
+            self._reap_locked()
+            if len(self._active) >= self.max_active and self._waiting >= self.max_waiting:
+                self.rejected += 1
+                raise TranscoderBusy()
+
+    def free_slots(self):
+        """Slots an ffmpeg could take right now without waiting"""
+        with self._cond:
+            self._reap_locked()
+            return max(0, self.max_active - len(self._active))
+
+    def acquire(self, wait=True):
+        """Wait for a free slot (unless wait is False), or raise TranscoderBusy"""
+        with self._cond:
+            self._reap_locked()
+            if len(self._active) >= self.max_active and self._waiting >= self.max_waiting:
+                self.rejected += 1
+                raise TranscoderBusy()
+            self._waiting += 1
+            try:
+                deadline = time.monotonic() + (self.wait_timeout if wait else 0)
+                while len(self._active) >= self.max_active:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.rejected += 1
+                        raise TranscoderBusy()
+                    # Wake up periodically to reap processes that exited on their own
+                    self._cond.wait(min(remaining, 0.5))
+                    self._reap_locked()
+            finally:
+                self._waiting -= 1
+            slot = next(self._slots)
+            self._active[slot] = None
+            self.spawned += 1
+            return slot
+
+    def release(self, slot):
+        with self._cond:
+            if self._active.pop(slot, False) is not False:
+                self._cond.notify()
+
+    def open(self, factory, wait=True):
+        """Create an FFmpeg audio source within the budget"""
+        slot = self.acquire(wait)
+        try:
+            with metrics.ffmpeg_spawn.time():
+                source = factory()
+        except Exception:
+            self.release(slot)
+            raise
+        with self._cond:
+            if slot in self._active:
+                self._active[slot] = getattr(source, '_process', None)
+        return TranscodedSource(source, self, slot)
+
+    def run(self, args):
+        """Run a one-shot ffmpeg command within the budget"""
+        slot = self.acquire()
+        try:
+            return subprocess.run(args, capture_output=True, check=True)
+        finally:
+            self.release(slot)
+
+    def stats(self):
+        with self._cond:
+            self._reap_locked()
+            return {
+                "active": len(self._active),
+                "waiting": self._waiting,
+                "max_active": self.max_active,
+                "spawned": self.spawned,
+                "rejected": self.rejected,
+            }
+
+
+# Shared budget for the whole process
+transcoder = TranscoderManager()
@@ -0,0 +1,181 @@
+"""
+Per-guild voice sessions
+Each guild gets its own voice client, player state and lock so that one bot
+process can serve many guilds without them evicting each other.
+"""
+
+import asyncio
+from collections import deque
+
+from crossfade import DEFAULT_SECONDS as DEFAULT_CROSSFADE
+from send_monitor import SendStats
+
+
+class GuildSettings:
+    """Per-guild preferences that outlive voice sessions"""
+
+    def __init__(self):
+        # Overlap between queued tracks in seconds (see crossfade.py)
+        self.crossfade = DEFAULT_CROSSFADE
+        # Playback gain, 1.0 = unchanged (see volume.py)
+        self.volume = 1.0
+
+
+class GuildSession:
+    """Voice and playback state owned by a single guild"""
+
+    def __init__(self, guild_id, settings=None):
+        self.guild_id = guild_id
+        # Volume and crossfade, kept by the SessionManager across sessions
+        self.settings = settings or GuildSettings()
+        self.voice_client = None
+        self.current_track = None
+        self.queue = deque()
+        # Source opened ahead of time for queue[0]
+        self.prefetched = None
+        # Pending call_later handle that primes queue[0] near the end of the track
+        self.prefetch_timer = None
+        # Source of the current track, used for the playback position
+        self.source = None
+        # (track, seconds) saved by stop/disconnect for !resume; kept by the
+        # SessionManager across sessions
+        self.resume_point = None
+        # Text channel of the last play request, for queue messages
+        self.text_channel = None
+        # What the voice client plays: the track, a crossfade chain or a mixer
+        self.output = None
+        # Mixer layering effects over the current track, if any (see mixer.py)
+        self.mixer = None
+        # Send lateness and source read timings (see send_monitor.py)
+        self.send_stats = SendStats()
+        # Bumped on every manual play/stop so stale after callbacks are ignored
+        self.generation = 0
+        # Serializes connect/move/play/stop for this guild only
+        self.lock = asyncio.Lock()
+        # Bumped by every play request; older requests give way to newer ones
+        self.control_ticket = 0
+
+    @property
+    def volume(self):
+        return self.settings.volume
+
+    @volume.setter
+    def volume(self, value):
+        self.settings.volume = value
+
+    @property
+    def crossfade(self):
+        return self.settings.crossfade
+
+    @crossfade.setter
+    def crossfade(self, value):
+        self.settings.crossfade = value
+
+    @property
+    def channel(self):
+        if self.voice_client is None:
+            return None
+        return self.voice_client.channel
+
+    def is_connected(self):
+        return self.voice_client is not None and self.voice_client.is_connected()
+
+    def is_playing(self):
+        return self.voice_client is not None and self.voice_client.is_playing()
+
+    def claim_control(self):
+        """Register a play request and return its ticket"""
+        self.control_ticket += 1
+        return self.control_ticket
+
+    def superseded(self, ticket):
+        """True if a newer request was made after this ticket"""
+        return ticket != self.control_ticket
+
+    def position(self):
+        """Seconds into the current track, or None if nothing is playing"""
+        if self.current_track is None or self.source is None:
+            return None
+        return getattr(self.source, 'elapsed', None)
+
+    def save_resume_point(self):
+        position = self.position()
+        if position is not None:
+            self.resume_point = (self.current_track, position)
+
+    def close(self):
+        """Drop the queue and pending prefetch work so nothing outlives playback"""
+        # Stale after callbacks must not advance the queue
+        self.generation += 1
+        self.queue.clear()
+        if self.prefetch_timer is not None:
+            self.prefetch_timer.cancel()
+            self.prefetch_timer = None
+        if self.prefetched is not None:
+            # Gives back its ffmpeg process and transcoder slot
+            self.prefetched.cleanup()
+            self.prefetched = None
+
+    async def disconnect(self):
+        """Disconnect from voice and reset player state"""
+        self.save_resume_point()
+        self.close()
+        if self.voice_client is not None:
+            await self.voice_client.disconnect()
+        self.voice_client = None
+        self.current_track = None
+        self.source = None
+
+
+class SessionManager:
+    """Registry of guild sessions keyed by guild ID"""
+
+    def __init__(self):
+        self._sessions = {}
+        # Resume points of guilds whose session was closed, for the next one
+        self._resume_points = {}
+        # Settings of every guild seen, shared with its successive sessions
+        self._settings = {}
+
+    def get(self, guild_id):
+        """Return the session for a guild, creating it on first use"""
+        session = self._sessions.get(guild_id)
+        if session is None:
+            settings = self._settings.setdefault(guild_id, GuildSettings())
+            session = GuildSession(guild_id, settings)
+            session.resume_point = self._resume_points.pop(guild_id, None)
+            self._sessions[guild_id] = session
+        return session
+
+    def peek(self, guild_id):
+        """Return the session for a guild without creating one"""
+        return self._sessions.get(guild_id)
+
+    def remove(self, guild_id):
+        """Drop a guild's session, keeping where it stopped for !resume"""
+        session = self._sessions.pop(guild_id, None)
+        if session is not None:
+            # Kicked sessions never went through disconnect()
+            session.save_resume_point()
+            session.close()
+            if session.resume_point is not None:
+                self._resume_points[guild_id] = session.resume_point
+        return session
+
+    def __iter__(self):
+        return iter(list(self._sessions.values()))
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def connected(self):
+        """Sessions that currently hold a voice connection"""
+        return [s for s in self if s.is_connected()]
+
+    def playing(self):
+        """Sessions that are currently sending audio"""
+        return [s for s in self if s.is_playing()]
+
+
+# Shared registry used by the bot and the dashboard
+sessions = SessionManager()